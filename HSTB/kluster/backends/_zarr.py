@@ -1,14 +1,192 @@
 import os
+import json
+import mmap
+import threading
 import numpy as np
 import xarray as xr
 import zarr
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
 from dask.distributed import wait, Client, progress, Future
 from typing import Union, Callable, Tuple, Any
 
 from HSTB.kluster import kluster_variables
 from HSTB.kluster.backends._base import BaseBackend
 
+# in process lock for writes that all happen in this process (skip_dask), avoids the file locks of ProcessSynchronizer
+thread_synchronizer = zarr.ThreadSynchronizer()
+
+# O_DIRECT requires the write buffer, size and file offset to be aligned to the logical block size of the file system,
+#   4096 covers the common block sizes.  O_DIRECT does not exist on Windows, where we always use buffered writes
+_direct_io_flag = getattr(os, 'O_DIRECT', None)
+_direct_io_alignment = 4096
+# per thread page aligned buffer, reused across chunk writes and grown as needed
+_direct_io_buffers = threading.local()
+# maximum number of variables written at the same time in ZarrWrite.write_to_zarr
+_variable_write_workers = 8
+
+
+def _direct_io_buffer(nbytes: int):
+    """
+    Return this thread's page aligned buffer for O_DIRECT writes, growing it if it is smaller than nbytes.  An
+    anonymous mmap is page aligned by construction.
+
+    Parameters
+    ----------
+    nbytes
+        required size of the buffer in bytes, must be a multiple of _direct_io_alignment
+
+    Returns
+    -------
+    mmap.mmap
+        page aligned buffer of at least nbytes
+    """
+
+    buf = getattr(_direct_io_buffers, 'buffer', None)
+    if buf is None or len(buf) < nbytes:
+        if buf is not None:
+            buf.close()
+        buf = mmap.mmap(-1, nbytes)
+        _direct_io_buffers.buffer = buf
+    return buf
+
+
+def _write_direct_io(data, fn: str):
+    """
+    Write data to file fn with O_DIRECT, bypassing the page cache.  The data is copied into a page aligned buffer and
+    written padded to the alignment size, then the file is truncated back to the actual data length.
+
+    Parameters
+    ----------
+    data
+        contiguous buffer (the encoded zarr chunk) to write
+    fn
+        path to the file to write
+    """
+
+    view = memoryview(data).cast('B')
+    nbytes = view.nbytes
+    padded = max(-(-nbytes // _direct_io_alignment), 1) * _direct_io_alignment
+    buf = _direct_io_buffer(padded)
+    buf[:nbytes] = view
+    buf[nbytes:padded] = bytes(padded - nbytes)
+    fd = os.open(fn, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _direct_io_flag, 0o666)
+    try:
+        bview = memoryview(buf)[:padded]
+        written = 0
+        while written < padded:
+            written += os.write(fd, bview[written:])
+        bview.release()
+        os.ftruncate(fd, nbytes)
+    finally:
+        os.close(fd)
+
+
+# metadata keys that we write as compact json, see DirectIODirectoryStore
+_compact_json_keys = ('.zattrs', '.zmetadata')
+
+
+def _compact_json(value: bytes):
+    """
+    Re-encode zarr json metadata without the indentation/whitespace zarr uses.  Kluster attribution (xyzrph, profiles,
+    settings) is large nested dicts, the indentation makes up a large part of the file.
+
+    Parameters
+    ----------
+    value
+        json encoded metadata from zarr
+
+    Returns
+    -------
+    bytes
+        the same json with compact separators, kept ascii as zarr decodes the metadata as ascii
+    """
+
+    return json.dumps(json.loads(bytes(value)), separators=(',', ':'), sort_keys=True).encode('ascii')
+
+
+class DirectIODirectoryStore(zarr.DirectoryStore):
+    """
+    zarr DirectoryStore that writes chunks with O_DIRECT, skipping the page cache round trip for the large array
+    chunks we write during conversion/processing.  Metadata files (.zarray, .zattrs, .zgroup) are small and rewritten
+    often, so those use the normal buffered write, and the attributes/consolidated metadata are written as compact
+    json.  If O_DIRECT is not available or the file system rejects it, we fall back to buffered writes for the rest of
+    the life of the store.
+
+    DirectoryStore writes each key to a temporary file and then moves it into place, we only replace the write of the
+    temporary file (_tofile) so that behavior is kept.
+
+    Within batched_writes, chunk writes are queued and then written all at once with a pool of threads when the
+    context exits, instead of one write call at a time as zarr encodes each chunk.  The queue is kept per thread, so
+    that threads writing different variables to the same store each batch their own chunks.
+    """
+
+    def __init__(self, path: str, normalize_keys: bool = False):
+        super().__init__(path, normalize_keys=normalize_keys)
+        self.direct_io = _direct_io_flag is not None
+        self._batch = threading.local()
+
+    @property
+    def _pending(self):
+        return getattr(self._batch, 'pending', None)
+
+    @_pending.setter
+    def _pending(self, value):
+        self._batch.pending = value
+
+    def __setitem__(self, key, value):
+        basename = key.rsplit('/', 1)[-1]
+        if basename in _compact_json_keys:
+            value = _compact_json(value)
+        elif self._pending is not None and not basename.startswith('.'):
+            self._pending[key] = value
+            return
+        super().__setitem__(key, value)
+
+    def __getitem__(self, key):
+        if self._pending is not None and key in self._pending:
+            return self._pending[key]
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        if self._pending is not None and key in self._pending:
+            return True
+        return super().__contains__(key)
+
+    @contextmanager
+    def batched_writes(self, max_workers: int = 8):
+        """
+        Queue all chunk writes made within this context and write them together in a thread pool when the context
+        exits.  Only use this when nothing else is writing to the same chunks, the chunk locks of the synchronizer are
+        released before the queued chunks are written.
+
+        Parameters
+        ----------
+        max_workers
+            maximum number of threads used to write the queued chunks
+        """
+
+        self._pending = {}
+        try:
+            yield self
+        finally:
+            pending, self._pending = self._pending, None
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+                    list(executor.map(lambda item: zarr.DirectoryStore.__setitem__(self, *item), pending.items()))
+
+    def _tofile(self, a, fn):
+        if self.direct_io and not os.path.basename(fn).startswith('.'):
+            try:
+                _write_direct_io(a, fn)
+                return
+            except (OSError, ValueError):  # file system does not support O_DIRECT (tmpfs, some network shares)
+                self.direct_io = False
+        with open(fn, mode='wb') as f:
+            f.write(a)
+
 
 class ZarrBackend(BaseBackend):
     """
@@ -123,8 +301,16 @@ def _get_indices_dataset_exists(input_time_arrays: list, zarr_time: zarr.Array):
     """
     running_total = 0
     write_indices = []
+    # read the zarr time once, and get the range once, instead of reading from the store for every input array
+    zarr_time = np.asarray(zarr_time[:])
+    if zarr_time.size:
+        zarr_min, zarr_max = zarr_time.min(), zarr_time.max()
     for input_time in input_time_arrays:
-        input_is_in_zarr = np.isin(input_time, zarr_time)
+        if not zarr_time.size or float(input_time.max()) < zarr_min or float(input_time.min()) > zarr_max:
+            # entirely outside the range of the existing zarr time, skip the isin check
+            input_is_in_zarr = np.zeros(1, dtype=bool)
+        else:
+            input_is_in_zarr = np.isin(input_time, zarr_time)
         if input_is_in_zarr.any():  # this input array is at least partly in this datastore already
             if not input_is_in_zarr.all():  # this input array is only partly in this datastore
                 raise NotImplementedError(
@@ -176,7 +362,7 @@ def get_write_indices_zarr(output_pth: str, input_time_arrays: list, index_dim='
         raise NotImplementedError('get_write_indices_zarr: input arrays are out of order in time')
 
     if os.path.exists(output_pth):
-        rootgroup = zarr.open(output_pth, mode='r')  # only opens if the path exists
+        rootgroup = open_zarr_readonly(output_pth)  # only opens if the path exists
         zarr_time = rootgroup[index_dim]
         write_indices, running_total = _get_indices_dataset_exists(input_time_arrays, zarr_time)
     else:  # datastore doesn't exist, we just return the write indices equal to the shape of the input arrays
@@ -215,6 +401,74 @@ def search_not_sorted(base: np.ndarray, search_array: np.ndarray):
     return final_inds
 
 
+def _json_default(obj: Any):
+    """
+    json.dumps default for the numpy objects that can show up in attribution before it is written to disk
+
+    Parameters
+    ----------
+    obj
+        object json can not serialize
+
+    Returns
+    -------
+    Any
+        json serializable version of obj
+    """
+
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def _attribute_hash_key(val: Any):
+    """
+    Attribute values are generally dicts/lists, which are not hashable.  Return the canonical (sorted keys) json string
+    of the value, so that we can check for duplicate attribute values with a set instead of a list.
+
+    Parameters
+    ----------
+    val
+        attribute value
+
+    Returns
+    -------
+    str
+        json string of val
+    """
+
+    return json.dumps(val, sort_keys=True, default=_json_default)
+
+
+@lru_cache(maxsize=32)
+def _nodata_value_for_dtype(arr_dtype: np.dtype, float_no_data_value: float, int_no_data_value: int):
+    """
+    Cached no data value lookup for ZarrWrite._get_arr_nodatavalue, np.issubdtype is slow enough to matter when run for
+    every variable of every write.
+
+    Parameters
+    ----------
+    arr_dtype
+        numpy dtype, dtype of input array
+    float_no_data_value
+        no data value for float dtypes
+    int_no_data_value
+        no data value for integer dtypes
+
+    Returns
+    -------
+    Union[str, int, float]
+        no data value, one of [float_no_data_value, int_no_data_value, '']
+    """
+
+    if np.issubdtype(arr_dtype, np.floating):
+        return float_no_data_value
+    elif np.issubdtype(arr_dtype, np.integer):
+        return int_no_data_value
+    else:
+        return ''
+
+
 def retry_call(callabl: Callable, args=None, kwargs=None, exceptions: Tuple[Any, ...] = (),
                retries: int = 200, wait: float = 0.1):
     """
@@ -252,7 +506,7 @@ class ZarrWrite:
                 chunk of zarr array is allowed to not be of length equal to zarr chunk size)
     """
     def __init__(self, zarr_path: str, desired_chunk_shape: dict = None, append_dim: str = 'time', expand_dim: str = 'beam',
-                 float_no_data_value: float = np.nan, int_no_data_value: int = 999):
+                 float_no_data_value: float = np.nan, int_no_data_value: int = 999, synchronizer: str = 'process'):
         """
         Initialize zarr write class
 
@@ -270,9 +524,13 @@ class ZarrWrite:
             float, no data value for variables that are dtype float
         int_no_data_value
             int, no data value for variables that are dtype int
+        synchronizer
+            str, one of 'process' (file based locks, required when dask workers write in parallel) or 'thread' (in
+            memory locks, only valid when all writes happen in this process)
         """
 
         self.zarr_path = zarr_path
+        self.synchronizer = synchronizer
         self.desired_chunk_shape = desired_chunk_shape
         self.append_dim = append_dim
         self.expand_dim = expand_dim
@@ -281,6 +539,10 @@ class ZarrWrite:
 
         self.rootgroup = None
         self.zarr_array_names = []
+        # set of zarr_array_names for fast membership checks during writes
+        self.zarr_array_names_set = set()
+        # in memory copy of the rootgroup attributes, see current_attributes
+        self._attrs_cache = None
 
         self.merge_chunks = False
 
@@ -295,16 +557,50 @@ class ZarrWrite:
         Open the zarr data store, will create a new one if it does not exist.  Get all the existing array names.
         """
 
-        sync = zarr.ProcessSynchronizer(self.zarr_path + '.sync')
-        self.rootgroup = zarr.open(self.zarr_path, mode='a', synchronizer=sync)
+        self.rootgroup = zarr.open(DirectIODirectoryStore(self.zarr_path), mode='a', synchronizer=self._build_synchronizer())
+        self._attrs_cache = None
         self.get_array_names()
 
+    def _build_synchronizer(self):
+        """
+        Return the zarr synchronizer matching self.synchronizer
+
+        Returns
+        -------
+        Union[zarr.ProcessSynchronizer, zarr.ThreadSynchronizer]
+            synchronizer used to lock chunks during writes
+        """
+
+        if self.synchronizer == 'thread':
+            return thread_synchronizer
+        elif self.synchronizer == 'process':
+            return zarr.ProcessSynchronizer(self.zarr_path + '.sync')
+        else:
+            raise ValueError('ZarrWrite: synchronizer must be one of "process", "thread", found {}'.format(self.synchronizer))
+
+    def current_attributes(self):
+        """
+        Return the attributes of the rootgroup as a dict.  The attributes are read (one read and parse of the .zattrs
+        json) the first time this is called and kept in memory, write_attributes keeps the copy up to date.
+
+        Returns
+        -------
+        dict
+            rootgroup attributes
+        """
+
+        if self._attrs_cache is None:
+            self._attrs_cache = dict(self.rootgroup.attrs)
+        return self._attrs_cache
+
     def get_array_names(self):
         """
-        Get all the existing array names as a list of strings and set self.zarr_array_names with that list
+        Get all the existing array names as a list of strings and set self.zarr_array_names with that list.  Also sets
+        self.zarr_array_names_set, the same names as a set for membership checks
         """
 
         self.zarr_array_names = [t for t in self.rootgroup.array_keys()]
+        self.zarr_array_names_set = set(self.zarr_array_names)
 
     def _attributes_only_unique_profile(self, attrs: dict):
         """
@@ -322,12 +618,13 @@ class ZarrWrite:
         """
 
         try:
-            new_profs = [x for x in attrs.keys() if x[0:7] == 'profile']
-            curr_profs = [x for x in self.rootgroup.attrs.keys() if x[0:7] == 'profile']
-            current_vals = [self.rootgroup.attrs[p] for p in curr_profs]
+            current_attrs = self.current_attributes()
+            new_profs = [x for x in attrs.keys() if x.startswith('profile_')]
+            curr_profs = [x for x in current_attrs.keys() if x.startswith('profile_')]
+            current_vals = {_attribute_hash_key(current_attrs[p]) for p in curr_profs}
             for prof in new_profs:
                 val = attrs[prof]
-                if val in current_vals:
+                if _attribute_hash_key(val) in current_vals:
                     try:  # find matching attribute key if exists
                         tstmp = prof.split('_')[1]
                         matching_attr = 'attributes_{}'.format(tstmp)
@@ -355,12 +652,13 @@ class ZarrWrite:
             attrs with only unique runtime settings dicts
         """
         try:
-            new_settings = [x for x in attrs.keys() if x[0:7] == 'runtime']
-            curr_settings = [x for x in self.rootgroup.attrs.keys() if x[0:7] == 'runtime']
-            current_vals = [self.rootgroup.attrs[p] for p in curr_settings]
+            current_attrs = self.current_attributes()
+            new_settings = [x for x in attrs.keys() if x.startswith('runtimesettings_')]
+            curr_settings = [x for x in current_attrs.keys() if x.startswith('runtimesettings_')]
+            current_vals = {_attribute_hash_key(current_attrs[p]) for p in curr_settings}
             for sett in new_settings:
                 val = attrs[sett]
-                if val in current_vals:
+                if _attribute_hash_key(val) in current_vals:
                     attrs.pop(sett)
         except:
             pass
@@ -381,12 +679,13 @@ class ZarrWrite:
             attrs with only unique settings dicts
         """
         try:
-            new_settings = [x for x in attrs.keys() if x[0:7] == 'install']
-            curr_settings = [x for x in self.rootgroup.attrs.keys() if x[0:7] == 'install']
-            current_vals = [self.rootgroup.attrs[p] for p in curr_settings]
+            current_attrs = self.current_attributes()
+            new_settings = [x for x in attrs.keys() if x.startswith('installsettings_')]
+            curr_settings = [x for x in current_attrs.keys() if x.startswith('installsettings_')]
+            current_vals = {_attribute_hash_key(current_attrs[p]) for p in curr_settings}
             for sett in new_settings:
                 val = attrs[sett]
-                if val in current_vals:
+                if _attribute_hash_key(val) in current_vals:
                     attrs.pop(sett)
         except:
             pass
@@ -411,19 +710,18 @@ class ZarrWrite:
 
         try:
             new_xyz = attrs['xyzrph']
-            new_tstmps = list(new_xyz[list(new_xyz.keys())[0]].keys())
-            curr_xyz = self.rootgroup.attrs['xyzrph']
-            curr_tstmps = list(curr_xyz[list(curr_xyz.keys())[0]].keys())
+            # list, as we pop these timestamps from new_xyz below
+            new_tstmps = list(new_xyz[next(iter(new_xyz))])
+            curr_xyz = self.current_attributes()['xyzrph']
+            curr_tstmps = curr_xyz[next(iter(curr_xyz))]
 
-            curr_vals = []
-            for tstmp in curr_tstmps:
-                curr_vals.append([curr_xyz[x][tstmp] for x in curr_xyz])
+            curr_vals = {_attribute_hash_key([curr_xyz[x][tstmp] for x in curr_xyz]) for tstmp in curr_tstmps}
             for tstmp in new_tstmps:
                 new_val = [new_xyz[x][tstmp] for x in new_xyz]
-                if new_val in curr_vals:
+                if _attribute_hash_key(new_val) in curr_vals:
                     for ky in new_xyz:
                         new_xyz[ky].pop(tstmp)
-            if not new_xyz[list(new_xyz.keys())[0]]:
+            if not new_xyz[next(iter(new_xyz))]:
                 attrs.pop('xyzrph')
         except:
             pass
@@ -439,11 +737,16 @@ class ZarrWrite:
             attributes associated with this zarr rootgroup
         """
         if attrs is not None:
+            if not self.current_attributes():  # first write, nothing to check against for duplicates
+                _my_xarr_to_zarr_writeattributes(self.rootgroup, attrs)
+                self._attrs_cache = dict(self.rootgroup.attrs)
+                return
             attrs = self._attributes_only_unique_profile(attrs)
             attrs = self._attributes_only_unique_settings(attrs)
             attrs = self._attributes_only_unique_runtime(attrs)
             attrs = self._attributes_only_unique_xyzrph(attrs)
             _my_xarr_to_zarr_writeattributes(self.rootgroup, attrs)
+            self._attrs_cache = dict(self.rootgroup.attrs)
 
     def _check_fix_rootgroup_expand_dim(self, xarr: xr.Dataset):
         """
@@ -486,16 +789,7 @@ class ZarrWrite:
             no data value, one of [self.float_no_data_value, self.int_no_data_value, '']
         """
 
-        isfloat = np.issubdtype(arr_dtype, np.floating)
-        if isfloat:
-            nodata = self.float_no_data_value
-        else:
-            isint = np.issubdtype(arr_dtype, np.integer)
-            if isint:
-                nodata = self.int_no_data_value
-            else:
-                nodata = ''
-        return nodata
+        return _nodata_value_for_dtype(np.dtype(arr_dtype), self.float_no_data_value, self.int_no_data_value)
 
     def fix_rootgroup_expand_dim(self, xarr: xr.Dataset):
         """
@@ -509,50 +803,19 @@ class ZarrWrite:
         """
 
         curr_expand_dim_size = self.rootgroup[self.expand_dim].size
+        expand_dim_size = xarr[self.expand_dim].shape[0]
         for var in self.zarr_array_names:
-            newdat = None
-            newshp = None
             if var == self.expand_dim:
-                newdat = np.arange(xarr[self.expand_dim].shape[0])
-                newshp = xarr[self.expand_dim].shape
+                self.rootgroup[var].resize(xarr[self.expand_dim].shape)
+                self.rootgroup[var][:] = np.arange(expand_dim_size)
             elif self.rootgroup[var].ndim >= 2:
                 if self.rootgroup[var].shape[1] == curr_expand_dim_size:  # you found an array with a beam dimension
                     nodata_value = self._get_arr_nodatavalue(self.rootgroup[var].dtype)
-                    newdat = self._inflate_expand_dim(self.rootgroup[var], xarr[self.expand_dim].shape[0], nodata_value)
                     newshp = list(self.rootgroup[var].shape)
-                    newshp[1] = xarr[self.expand_dim].shape[0]
-                    newshp = tuple(newshp)
-            if newdat is not None:
-                self.rootgroup[var].resize(newshp)
-                self.rootgroup[var][:] = newdat
-
-    def _inflate_expand_dim(self, input_arr: Union[np.array, zarr.Array, xr.DataArray],
-                            expand_dim_size: int, nodata: Union[int, float, str]):
-        """
-        Take in the rootgroup and expand the beam dimension to the expand_dim_size, filling the empty space with the
-        nodata value.
-
-        Parameters
-        ----------
-        input_arr
-            numpy like object, includes zarr.core.Array and xarray.core.dataarray.DataArray, data that we want to expand to match the expand dim size
-        expand_dim_size
-            size of the expand_dim (probably beam) that we need
-        nodata
-            one of [self.float_no_data_value, self.int_no_data_value, '']
-
-        Returns
-        -------
-        Union[np.array, zarr.Array, xr.DataArray]
-            input_arr with expanded beam dimension
-        """
-
-        if input_arr.ndim == 3:
-            appended_data = np.full((input_arr.shape[0], expand_dim_size - input_arr.shape[1], input_arr.shape[2]), nodata)
-        else:
-            appended_data = np.full((input_arr.shape[0], expand_dim_size - input_arr.shape[1]), nodata)
-        new_arr = np.concatenate((input_arr, appended_data), axis=1)
-        return new_arr
+                    newshp[1] = expand_dim_size
+                    # resize keeps the existing data in place, we only need to fill the new beams with no data value
+                    self.rootgroup[var].resize(tuple(newshp))
+                    self.rootgroup[var][:, curr_expand_dim_size:expand_dim_size] = nodata_value
 
     def correct_rootgroup_dims(self, xarr: xr.Dataset):
         """
@@ -592,7 +855,7 @@ class ZarrWrite:
             startingshp = tuple(startingshp)
         return startingshp
 
-    def _write_determine_shape(self, var: str, dims_of_arrays: dict, finalsize: int = None):
+    def _write_determine_shape(self, var: str, dims_of_arrays: dict, finalsize: int = None, axis_map: dict = None):
         """
         Given the size information and dimension names for the given variable, determine the axis to append to and the
         expected shape for the rootgroup array.
@@ -606,6 +869,9 @@ class ZarrWrite:
         finalsize
             will resize zarr to the expected final size after all writes have been performed. If None, will generate
             desired shape but not be used
+        axis_map
+            optional, where keys are array names and values are a dict of dimension name: axis index, built once per
+            write in write_to_zarr.  Example: 'beampointingangle': {'time': 0, 'sector': 1, 'beam': 2}
 
         Returns
         -------
@@ -625,18 +891,24 @@ class ZarrWrite:
             startingshp = dims_of_arrays[var][1]
         else:
             # want to get the length of the time dimension, so you know which dim to append to
-            timaxis = dims_of_arrays[var][0].index(self.append_dim)
+            if axis_map is not None:
+                timaxis = axis_map[var][self.append_dim]
+            else:
+                timaxis = dims_of_arrays[var][0].index(self.append_dim)
             timlength = dims_of_arrays[var][1][timaxis]
-            startingshp = tuple(
-                finalsize if dims_of_arrays[var][1].index(x) == timaxis else x for x in dims_of_arrays[var][1])
+            startingshp = tuple(finalsize if i == timaxis else x for i, x in enumerate(dims_of_arrays[var][1]))
         return timaxis, timlength, startingshp
 
     def _write_existing_rootgroup(self, xarr: xr.Dataset, data_loc_copy: Union[list, np.ndarray], var_name: str, dims_of_arrays: dict,
                                   chunksize: tuple, timlength: int, timaxis: int, startingshp: tuple):
         """
         A slightly different operation than _write_new_dataset_rootgroup.  To write to an existing rootgroup array,
-        we use the data_loc as an index and create a new zarr array from the xarray Dataarray.  The data_loc is only
-        used if the var is a time based array.
+        we use the data_loc as an index and write the numpy values of the xarray Dataarray directly to the rootgroup
+        array.  The data_loc is only used if the var is a time based array.
+
+        Writes are fastest when a [start, end] data_loc falls on chunk boundaries along time (see
+        get_write_indices_zarr and _chunk_aligned), zarr then compresses each chunk once without reading back the
+        existing chunk to merge with.
 
         Parameters
         ----------
@@ -662,31 +934,90 @@ class ZarrWrite:
 
         # array to be written
         xarr_data = xarr[var_name].values
+        # each rootgroup[var_name] builds a new zarr.Array from the .zarray metadata on disk, only look it up once
+        rootgroup_array = self.rootgroup[var_name]
         if startingshp is not None:
             startingshp = self._write_adjust_max_beams(startingshp)
-            self.rootgroup[var_name].resize(startingshp)
+            rootgroup_array.resize(startingshp)
 
         if isinstance(data_loc_copy, list):  # [start index, end index]
             # the last write will often be less than the block size.  This is allowed in the zarr store, but we
-            #    need to correct the index for it.
+            #    need to correct the index for it.  Build a new list, the data loc is shared by all variables in the write
             if timlength != data_loc_copy[1] - data_loc_copy[0]:
-                data_loc_copy[1] = data_loc_copy[0] + timlength
+                data_loc_copy = [data_loc_copy[0], data_loc_copy[0] + timlength]
 
             # location for new data, assume constant chunksize (as we are doing this outside of this function)
             chunk_time_range = slice(data_loc_copy[0], data_loc_copy[1])
             # use the chunk_time_range for writes unless this variable is a non-time dim array (beam for example)
-            chunk_idx = tuple(
-                chunk_time_range if dims_of_arrays[var_name][1].index(i) == timaxis else slice(0, i) for i in
-                dims_of_arrays[var_name][1])
-            self.rootgroup[var_name][chunk_idx] = zarr.array(xarr_data, shape=dims_of_arrays[var_name][1], chunks=chunksize)
+            chunk_idx = tuple(chunk_time_range if cnt == timaxis else slice(0, i) for cnt, i in
+                              enumerate(dims_of_arrays[var_name][1]))
+            batch = nullcontext()
+            if startingshp is None and self._chunk_aligned(rootgroup_array, data_loc_copy, timaxis):
+                # this write only covers whole chunks, no other write touches them, skip the chunk locks and write
+                #   all the chunks together
+                zarr_array = self._unsynchronized_array(var_name)
+                if isinstance(self.rootgroup.store, DirectIODirectoryStore):
+                    batch = self.rootgroup.store.batched_writes()
+            else:
+                zarr_array = rootgroup_array
+            with batch:
+                # write the numpy data directly, cast to the zarr dtype the same way the intermediate zarr.array write did
+                zarr_array[chunk_idx] = xarr_data.astype(zarr_array.dtype, copy=False)
         else:  # np.array([4,5,6,1,2,3,8,9...]), indices of the new data, might not be sorted
             sorted_order = data_loc_copy.argsort()
             xarr_data = xarr_data[sorted_order]
             data_loc_copy = data_loc_copy[sorted_order]
-            zarr_mask = np.zeros_like(self.rootgroup[var_name], dtype=bool)
-            zarr_mask[data_loc_copy] = True
-            # seems to require me to ravel first, examples only show setting with integer, not sure what is going on here
-            self.rootgroup[var_name].set_mask_selection(zarr_mask, xarr_data.ravel())
+            # select the time indices along the first (time) axis and the extent of the data along the rest.  A full size
+            #   boolean mask (np.zeros_like on the zarr array) would read the whole array from disk just for its shape
+            selection = (data_loc_copy,) + tuple(slice(0, i) for i in xarr_data.shape[1:])
+            rootgroup_array.set_orthogonal_selection(selection, xarr_data)
+
+    def _chunk_aligned(self, zarr_array: zarr.Array, data_loc_copy: list, timaxis: int):
+        """
+        Check if the [start index, end index] write to zarr_array covers only whole chunks along the time dimension (the
+        last chunk of the array is allowed to be partial).  Distributed writes are split along time, so a chunk aligned
+        write is the only writer to its chunks and does not need the chunk lock.
+
+        Parameters
+        ----------
+        zarr_array
+            rootgroup array being written to
+        data_loc_copy
+            [start time index, end time index] for the write
+        timaxis
+            index of the time dimension
+
+        Returns
+        -------
+        bool
+            True if the write is chunk aligned
+        """
+
+        if timaxis is None:
+            return False
+        time_chunk = zarr_array.chunks[timaxis]
+        start, end = data_loc_copy
+        if start % time_chunk:
+            return False
+        return not (end % time_chunk) or end == zarr_array.shape[timaxis]
+
+    def _unsynchronized_array(self, var_name: str):
+        """
+        Return the zarr array for var_name without the synchronizer, for writes that do not need the chunk locks, see
+        _chunk_aligned
+
+        Parameters
+        ----------
+        var_name
+            variable name
+
+        Returns
+        -------
+        zarr.Array
+            the rootgroup array with no synchronizer
+        """
+
+        return zarr.Array(self.rootgroup.store, path=var_name, chunk_store=self.rootgroup.chunk_store, synchronizer=None)
 
     def _write_new_dataset_rootgroup(self, xarr: xr.Dataset, var_name: str, dims_of_arrays: dict, chunksize: tuple,
                                      startingshp: tuple):
@@ -712,7 +1043,7 @@ class ZarrWrite:
 
         sync = None
         if self.zarr_path:
-            sync = zarr.ProcessSynchronizer(self.zarr_path + '.sync')
+            sync = self._build_synchronizer()
         newarr = self.rootgroup.create_dataset(var_name, shape=dims_of_arrays[var_name][1], chunks=chunksize,
                                                dtype=xarr[var_name].dtype, synchronizer=sync,
                                                fill_value=self._get_arr_nodatavalue(xarr[var_name].dtype))
@@ -745,44 +1076,85 @@ class ZarrWrite:
             path to zarr data store
         """
         if finalsize is not None:
+            # first write changes the structure of the store, the consolidated metadata is rebuilt after all the writes
+            remove_consolidated_metadata(self.zarr_path)
             self.correct_rootgroup_dims(xarr)
-        self.get_array_names()
+            # only the first write changes the arrays in the store, later writes use the names from the open
+            self.get_array_names()
         dims_of_arrays = _my_xarr_to_zarr_build_arraydimensions(xarr)
+        # dimension name: axis index for each array, so we only search the dimension names once per array
+        axis_map = {var: {dimname: cnt for cnt, dimname in enumerate(dims_of_arrays[var][0])} for var in dims_of_arrays}
         self.write_attributes(attrs)
 
-        for var in dims_of_arrays:
-            already_written = var in self.zarr_array_names
-            if var in ['beam', 'xyz'] and already_written:
-                # no append_dim (usually time) component to these arrays
-                # You should only have to write this once, if beam dim expands, correct_rootgroup_dims handles it
-                continue
-
-            timaxis, timlength, startingshp = self._write_determine_shape(var, dims_of_arrays, finalsize)
-            chunksize = self.desired_chunk_shape[var]
-            if isinstance(dataloc, list):
-                data_loc_copy = dataloc.copy()
-            else:
-                data_loc_copy = dataloc
-
-            # shape is extended on append.  chunks will always be equal to shape, as each run of this function will be
-            #     done on one chunk of data by one worker
-            if var in self.zarr_array_names:
-                if finalsize is not None:  # appending data, first write contains the final shape of the data
-                    self._write_existing_rootgroup(xarr, data_loc_copy, var, dims_of_arrays, chunksize, timlength,
-                                                   timaxis, startingshp)
-                else:
-                    self._write_existing_rootgroup(xarr, data_loc_copy, var, dims_of_arrays, chunksize, timlength,
-                                                   timaxis, None)
-            else:
-                self._write_new_dataset_rootgroup(xarr, var, dims_of_arrays, chunksize, startingshp)
+        # no append_dim (usually time) component to beam/xyz, you should only have to write them once.  If beam dim
+        #   expands, correct_rootgroup_dims handles it
+        write_vars = [var for var in dims_of_arrays if not (var in ['beam', 'xyz'] and var in self.zarr_array_names_set)]
+        already_written = [var in self.zarr_array_names_set for var in write_vars]
+        # each variable is a separate array in the store, write them in parallel, compression and disk writes release
+        #   the GIL
+        if len(write_vars) > 1:
+            with ThreadPoolExecutor(max_workers=min(_variable_write_workers, len(write_vars))) as executor:
+                futs = [executor.submit(self._write_variable, xarr, var, written, dataloc, dims_of_arrays, axis_map,
+                                        finalsize) for var, written in zip(write_vars, already_written)]
+                for fut in futs:  # raise any exception from the writes
+                    fut.result()
+        else:
+            for var, written in zip(write_vars, already_written):
+                self._write_variable(xarr, var, written, dataloc, dims_of_arrays, axis_map, finalsize)
 
-            # _ARRAY_DIMENSIONS is used by xarray for connecting dimensions with zarr arrays
-            self.rootgroup[var].attrs['_ARRAY_DIMENSIONS'] = dims_of_arrays[var][0]
+        for var, written in zip(write_vars, already_written):
+            if not written:
+                self.zarr_array_names.append(var)
+                self.zarr_array_names_set.add(var)
         return self.zarr_path
 
+    def _write_variable(self, xarr: xr.Dataset, var: str, already_written: bool, dataloc: Union[list, np.ndarray],
+                        dims_of_arrays: dict, axis_map: dict, finalsize: int = None):
+        """
+        Write one variable of the xarray Dataset to the rootgroup, either creating a new array or writing into the
+        existing one.  See write_to_zarr.
+
+        Parameters
+        ----------
+        xarr
+            xarray Dataset, data to write to zarr
+        var
+            variable name
+        already_written
+            True if the variable already exists as an array in the rootgroup
+        dataloc
+            either [start time index, end time index] for xarr, ex: [0,1000] if xarr time dimension is 1000 long,
+            or np.array([4,5,6,7,1,2...]) for when data might not be continuous and we need to use a boolean mask
+        dims_of_arrays
+            where keys are array names and values list of dims/shape.  Example: 'beampointingangle': [['time', 'sector', 'beam'], (5000, 3, 400)]
+        axis_map
+            dimension name: axis index for each array
+        finalsize
+            optional, int, if provided will resize zarr to the expected final size after all writes have been
+            performed.
+        """
+
+        timaxis, timlength, startingshp = self._write_determine_shape(var, dims_of_arrays, finalsize, axis_map)
+        chunksize = self.desired_chunk_shape[var]
+
+        # shape is extended on append.  chunks will always be equal to shape, as each run of this function will be
+        #     done on one chunk of data by one worker
+        if already_written:
+            if finalsize is not None:  # appending data, first write contains the final shape of the data
+                self._write_existing_rootgroup(xarr, dataloc, var, dims_of_arrays, chunksize, timlength,
+                                               timaxis, startingshp)
+            else:
+                self._write_existing_rootgroup(xarr, dataloc, var, dims_of_arrays, chunksize, timlength,
+                                               timaxis, None)
+        else:
+            self._write_new_dataset_rootgroup(xarr, var, dims_of_arrays, chunksize, startingshp)
+            # _ARRAY_DIMENSIONS is used by xarray for connecting dimensions with zarr arrays.  The dimension names
+            #   never change after the array is created, so we only write this (a .zattrs write) once
+            self.rootgroup[var].attrs['_ARRAY_DIMENSIONS'] = dims_of_arrays[var][0]
+
 
 def zarr_write(zarr_path: str, xarr: xr.Dataset, attrs: dict, desired_chunk_shape: dict, dataloc: Union[list, np.ndarray],
-               append_dim: str = 'time', finalsize: int = None):
+               append_dim: str = 'time', finalsize: int = None, synchronizer: str = 'process'):
     """
     Convenience function for writing with ZarrWrite
 
@@ -804,6 +1176,8 @@ def zarr_write(zarr_path: str, xarr: xr.Dataset, attrs: dict, desired_chunk_shap
     finalsize
         optional, if provided will resize zarr to the expected final size after all writes have been performed.  (We
         need to resize the zarr for that expected size before writing)
+    synchronizer
+        one of 'process', 'thread', see ZarrWrite
 
     Returns
     -------
@@ -811,11 +1185,35 @@ def zarr_write(zarr_path: str, xarr: xr.Dataset, attrs: dict, desired_chunk_shap
         path to zarr data store
     """
 
-    zw = ZarrWrite(zarr_path, desired_chunk_shape, append_dim=append_dim)
+    zw = ZarrWrite(zarr_path, desired_chunk_shape, append_dim=append_dim, synchronizer=synchronizer)
     zarr_path = retry_call(zw.write_to_zarr, (xarr, attrs, dataloc), {'finalsize': finalsize}, exceptions=(PermissionError,))
     return zarr_path
 
 
+def _zarr_write_after(previous_write: Union[Future, str], *args, **kwargs):
+    """
+    zarr_write that takes a previous write as the first argument.  When submitted with the future of the previous write,
+    dask will not run this write until the previous write is complete.  Used to serialize writes without waiting on
+    each one in the client.
+
+    Parameters
+    ----------
+    previous_write
+        the future (resolved to the zarr path by dask) of the write that has to finish first
+    args
+        positional arguments to zarr_write
+    kwargs
+        keyword arguments to zarr_write
+
+    Returns
+    -------
+    str
+        path to zarr data store
+    """
+
+    return zarr_write(*args, **kwargs)
+
+
 def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_sizes: dict, data_locs: list,
                        finalsize: int, client: Client, append_dim: str = 'time',
                        write_in_parallel: bool = False, skip_dask: bool = False, show_progress: bool = True):
@@ -824,8 +1222,9 @@ def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_si
     zarr_path.  We use the function (and not the class directly) in Dask when we map it across all the workers.  Dask
     serializes data when mapping, so passing classes causes issues.
 
-    Currently we wait between each write.  This seems to deal with the occassional permissions error that pops up
-    when letting dask write in parallel.  Maybe we aren't using the sync object correctly?  Needs more testing.
+    The first write is always done on its own, as it sets up (or resizes) the datastore.  The remaining writes are all
+    submitted at once, either to run in parallel (chunks are locked with the ProcessSynchronizer, see ZarrWrite) or
+    chained one after the other, and we wait on them once at the end.
 
     Parameters
     ----------
@@ -863,13 +1262,15 @@ def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_si
     """
 
     if skip_dask:  # run the zarr write process without submitting to a dask client
+        # all writes happen in this process, so we can use the in memory thread locks instead of the file locks
         for cnt, arr in enumerate(xarrays):
             if cnt == 0:
                 futs = [zarr_write(zarr_path, arr, attributes, chunk_sizes, data_locs[cnt],
-                        append_dim=append_dim, finalsize=finalsize)]
+                        append_dim=append_dim, finalsize=finalsize, synchronizer='thread')]
             else:
                 futs.append([zarr_write(zarr_path, xarrays[cnt], None, chunk_sizes, data_locs[cnt],
-                             append_dim=append_dim)])
+                             append_dim=append_dim, synchronizer='thread')])
+        consolidate_metadata(zarr_path)
     else:
         futs = [client.submit(zarr_write, zarr_path, xarrays[0], attributes, chunk_sizes, data_locs[0],
                               append_dim=append_dim, finalsize=finalsize)]
@@ -878,17 +1279,74 @@ def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_si
         wait(futs)
         if len(xarrays) > 1:
             for i in range(len(xarrays) - 1):
-                futs.append(client.submit(zarr_write, zarr_path, xarrays[i + 1], None, chunk_sizes,
-                                          data_locs[i + 1], append_dim=append_dim))
-                if not write_in_parallel:  # wait on each future, write one data chunk at a time
-                    wait(futs)
-            if write_in_parallel:  # don't wait on the futures until you append all of them
-                if show_progress:
-                    progress(futs, multi=False)
-                wait(futs)
+                if write_in_parallel:
+                    futs.append(client.submit(zarr_write, zarr_path, xarrays[i + 1], None, chunk_sizes,
+                                              data_locs[i + 1], append_dim=append_dim))
+                else:  # chain each write on the last one, dask runs them one at a time without us waiting on each
+                    futs.append(client.submit(_zarr_write_after, futs[-1], zarr_path, xarrays[i + 1], None, chunk_sizes,
+                                              data_locs[i + 1], append_dim=append_dim))
+            # submit all of the writes and then wait once
+            if show_progress:
+                progress(futs, multi=False)
+            wait(futs)
+        consolidate_metadata(zarr_path)
     return futs
 
 
+def consolidate_metadata(zarr_path: str):
+    """
+    Write the consolidated metadata (.zmetadata) for the zarr data store, so that opening the store later is a single
+    metadata read instead of one read per array.  Must be done after every write that changes the metadata of the
+    store, as readers will use the consolidated metadata if it exists, see remove_consolidated_metadata
+
+    Parameters
+    ----------
+    zarr_path
+        path to zarr data store
+    """
+
+    if zarr_path and os.path.exists(zarr_path):
+        zarr.consolidate_metadata(DirectIODirectoryStore(zarr_path))
+
+
+def remove_consolidated_metadata(zarr_path: str):
+    """
+    Remove the consolidated metadata (.zmetadata) for the zarr data store, so that no one reads the out of date
+    metadata during a write that changes the structure of the store.
+
+    Parameters
+    ----------
+    zarr_path
+        path to zarr data store
+    """
+
+    if zarr_path:
+        try:
+            os.remove(os.path.join(zarr_path, '.zmetadata'))
+        except FileNotFoundError:
+            pass
+
+
+def open_zarr_readonly(zarr_path: str):
+    """
+    Open the zarr data store read only, using the consolidated metadata if it exists.
+
+    Parameters
+    ----------
+    zarr_path
+        path to zarr data store
+
+    Returns
+    -------
+    zarr.hierarchy.Group
+        zarr rootgroup
+    """
+
+    if os.path.exists(os.path.join(zarr_path, '.zmetadata')):
+        return zarr.open_consolidated(zarr_path, mode='r')
+    return zarr.open(zarr_path, mode='r')
+
+
 def zarr_write_attributes(zarr_path: str, attrs: dict):
     """
     Convenience function for writing attribution to kluster zarr datastore.  We do many things with incoming attribution
@@ -904,6 +1362,7 @@ def zarr_write_attributes(zarr_path: str, attrs: dict):
     """
     zw = ZarrWrite(zarr_path)
     zw.write_attributes(attrs)
+    consolidate_metadata(zarr_path)
 
 
 def _my_xarr_to_zarr_writeattributes(rootgroup: zarr.hierarchy.Group, attrs: dict):
@@ -919,38 +1378,46 @@ def _my_xarr_to_zarr_writeattributes(rootgroup: zarr.hierarchy.Group, attrs: dic
     """
 
     if attrs is not None:
+        # merge everything in memory and write the .zattrs once, each rootgroup.attrs[att] = val rewrites the whole file
+        current_attrs = rootgroup.attrs.asdict()
+        updates = {}
         for att in attrs:
 
             # ndarray is not json serializable
             if isinstance(attrs[att], np.ndarray):
                 attrs[att] = attrs[att].tolist()
 
-            if att not in rootgroup.attrs:
+            if att not in current_attrs:
+                updates[att] = attrs[att]
+            elif isinstance(attrs[att], list):
                 try:
-                    rootgroup.attrs[att] = attrs[att]
+                    dat = list(current_attrs[att])
+                    for sub_att in attrs[att]:
+                        if sub_att not in dat:
+                            dat.append(sub_att)
+                    updates[att] = dat
                 except:
-                    print('Unable to assign {} to key {}'.format(attrs[att], att))
+                    print('Unable to append to {} with value {}'.format(att, attrs[att]))
+            elif isinstance(attrs[att], dict) and att != 'status_lookup':
+                try:
+                    dat = dict(current_attrs[att])
+                    dat.update(attrs[att])
+                    updates[att] = dat
+                except:
+                    print('Unable to update {} with value {}'.format(att, attrs[att]))
             else:
-                if isinstance(attrs[att], list):
-                    try:
-                        for sub_att in attrs[att]:
-                            if sub_att not in rootgroup.attrs[att]:
-                                rootgroup.attrs[att].append(sub_att)
-                    except:
-                        print('Unable to append to {} with value {}'.format(att, attrs[att]))
-                elif isinstance(attrs[att], dict) and att != 'status_lookup':
-                    # have to load update and save to update dict attributes for some reason
-                    try:
-                        dat = rootgroup.attrs[att]
-                        dat.update(attrs[att])
-                        rootgroup.attrs[att] = dat
-                    except:
-                        print('Unable to update {} with value {}'.format(att, dat))
-                else:
+                updates[att] = attrs[att]
+
+        if updates:
+            try:
+                rootgroup.attrs.update(updates)
+            except:
+                # write them one at a time, so that one attribute that can not be written does not drop the rest
+                for att, val in updates.items():
                     try:
-                        rootgroup.attrs[att] = attrs[att]
+                        rootgroup.attrs[att] = val
                     except:
-                        print('Unable to replace {} with value {}'.format(att, dat))
+                        print('Unable to assign {} to key {}'.format(val, att))
 
 
 def _my_xarr_to_zarr_build_arraydimensions(xarr: xr.Dataset):
@@ -968,11 +1435,9 @@ def _my_xarr_to_zarr_build_arraydimensions(xarr: xr.Dataset):
         where keys are array names and values list of dims/shape.  Example: 'beampointingangle': [['time', 'sector', 'beam'], (5000, 3, 400)]
     """
 
-    dims_of_arrays = {}
-    arrays_in_xarr = list(xarr.variables.keys())
-    for arr in arrays_in_xarr:
-        if xarr[arr].dims and xarr[arr].shape:  # only return arrays that have dimensions/shape
-            dims_of_arrays[arr] = [xarr[arr].dims, xarr[arr].shape, xarr[arr].chunks]
+    # use the Variables directly, xarr[arr] builds a new DataArray on each lookup
+    # only return arrays that have dimensions/shape
+    dims_of_arrays = {arr: [var.dims, var.shape, var.chunks] for arr, var in xarr.variables.items() if var.dims and var.shape}
     return dims_of_arrays
 
 
@@ -997,4 +1462,5 @@ def my_xarr_add_attribute(attrs: dict, outputpth: str):
     sync = zarr.ProcessSynchronizer(outputpth + '.sync')
     rootgroup = zarr.open(outputpth, mode='a', synchronizer=sync)
     _my_xarr_to_zarr_writeattributes(rootgroup, attrs)
+    consolidate_metadata(outputpth)
     return outputpth
@@ -109,6 +109,26 @@ def get_max_cluster_allocated_memory(client: Client):
     return np.sum(mem_per_worker) / (1024 ** 3)
 
 
+def get_cluster_memory_usage(client: Client):
+    """
+    Retrieve the memory currently in use across all workers in the cluster added together
+
+    Parameters
+    ----------
+    client
+        dask client needed to get the worker metrics
+
+    Returns
+    -------
+    float
+        sum of used memory across all workers
+    """
+
+    workers = client.scheduler_info()['workers'].values()
+    mem_per_worker = [wrk['metrics']['memory'] for wrk in workers]
+    return np.sum(mem_per_worker) / (1024 ** 3)
+
+
 def get_number_of_workers(client: Client):
     """
     Retrieve the total number of workers from the dask cluster
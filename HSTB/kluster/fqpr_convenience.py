@@ -1,27 +1,46 @@
 import os
+import copy
+import hashlib
+import json
+import logging
+from functools import lru_cache
 from time import perf_counter
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 import xarray as xr
 import numpy as np
+import dask
+import dask.array as da
 from dask.distributed import Client
 from typing import Union
 from matplotlib.gridspec import GridSpec
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 
 from HSTB.drivers.par3 import AllRead
 from HSTB.drivers.kmall import kmall
 from HSTB.kluster.xarray_conversion import BatchRead
 from HSTB.kluster.fqpr_generation import Fqpr
 from HSTB.kluster.fqpr_surface import BaseSurface
-from HSTB.kluster.fqpr_helpers import return_directory_from_data
+from HSTB.kluster.fqpr_helpers import return_directory_from_data, return_files_from_path
 from HSTB.kluster.fqpr_surface_v3 import QuadManager
+from HSTB.kluster.dask_helpers import get_cluster_memory_usage, get_max_cluster_allocated_memory
+from HSTB.kluster.numba_helpers import dual_head_match
 from HSTB.kluster import kluster_variables
 
+logger = logging.getLogger(__name__)
+
+# number of evenly spaced 78 records decoded with par to validate the direct delay read, see _tx_delays_from_allfile
+_tx_delay_check_count = 16
+
 
 def perform_all_processing(filname: Union[str, list], navfiles: list = None, outfold: str = None, coord_system: str = 'NAD83',
                            vert_ref: str = 'waterline', orientation_initial_interpolation: bool = False,
                            add_cast_files: Union[str, list] = None,
                            skip_dask: bool = False, show_progress: bool = True, parallel_write: bool = True,
-                           vdatum_directory: str = None, **kwargs):
+                           vdatum_directory: str = None, auto_skip_dask: bool = True, precomputed_files: list = None,
+                           **kwargs):
     """
     Use fqpr_generation to process multibeam data on the local cluster and generate a sound velocity corrected,
     georeferenced xyz with uncertainty in csv files in the provided output folder.
@@ -55,6 +74,12 @@ def perform_all_processing(filname: Union[str, list], navfiles: list = None, out
         if True, will write in parallel to disk, Disable for permissions issues troubleshooting.
     vdatum_directory
         if 'NOAA MLLW' 'NOAA MHW' is the vertical reference, a path to the vdatum directory is required here
+    auto_skip_dask
+        if True, will set skip_dask if the total size of the multibeam files is less than
+        kluster_variables.auto_skip_dask_size, where the time to start the dask client outweighs the benefit
+    precomputed_files
+        optional list of multibeam file paths that have already been found, used instead of filname to skip searching
+        the file system again.  Useful when running many jobs against the same (possibly remote) directory.
 
     Returns
     -------
@@ -62,6 +87,14 @@ def perform_all_processing(filname: Union[str, list], navfiles: list = None, out
         Fqpr object containing processed data
     """
 
+    if precomputed_files:
+        filname = precomputed_files
+    if not skip_dask and auto_skip_dask:
+        mfiles = return_files_from_path(filname, file_ext=frozenset(kluster_variables.supported_multibeam))
+        if mfiles and sum(os.path.getsize(f) for f in mfiles) < kluster_variables.auto_skip_dask_size * 1024 ** 2:
+            print('perform_all_processing: small dataset found, running without dask')
+            skip_dask = True
+
     fqpr_inst = convert_multibeam(filname, outfold, skip_dask=skip_dask, show_progress=show_progress, parallel_write=parallel_write)
     if navfiles is not None:
         fqpr_inst = import_processed_navigation(fqpr_inst, navfiles, **kwargs)
@@ -72,7 +105,7 @@ def perform_all_processing(filname: Union[str, list], navfiles: list = None, out
 
 
 def convert_multibeam(filname: Union[str, list], outfold: str = None, client: Client = None, skip_dask: bool = False,
-                      show_progress: bool = True, parallel_write: bool = True):
+                      show_progress: bool = True, parallel_write: bool = True, precomputed_files: list = None):
     """
     Use fqpr_generation to process multibeam data on the local cluster and generate a new Fqpr instance saved to the
     provided output folder.
@@ -95,6 +128,9 @@ def convert_multibeam(filname: Union[str, list], outfold: str = None, client: Cl
         If true, uses dask.distributed.progress.  Disabled for GUI, as it generates too much text
     parallel_write
         if True, will write in parallel to disk.  Disable for permissions issues troubleshooting.
+    precomputed_files
+        optional list of multibeam file paths that have already been found, used instead of filname to skip searching
+        the file system again.
 
     Returns
     -------
@@ -102,9 +138,12 @@ def convert_multibeam(filname: Union[str, list], outfold: str = None, client: Cl
         Fqpr containing converted source data
     """
 
+    if precomputed_files:
+        filname = precomputed_files
     mbes_read = BatchRead(filname, dest=outfold, client=client, skip_dask=skip_dask, show_progress=show_progress,
                           parallel_write=parallel_write)
     fqpr_inst = Fqpr(mbes_read, show_progress=show_progress, parallel_write=parallel_write)
+    fqpr_inst.owns_client = client is None and not skip_dask
     fqpr_inst.read_from_source()
     return fqpr_inst
 
@@ -289,15 +328,58 @@ def process_multibeam(fqpr_inst: Fqpr, run_orientation: bool = True, orientation
         fqpr_inst.sv_correct(add_cast_files=add_cast_files)
     if run_georef:
         fqpr_inst.georef_xyz(vdatum_directory=vdatum_directory)
-        fqpr_inst.calculate_total_uncertainty()
+        # the signature of the last tpu run is saved in the ping records, so this also works after reload_data
+        tpu_signature = _tpu_signature(fqpr_inst)
+        if all(rp.attrs.get('tpu_signature') == tpu_signature and 'tvu' in rp for rp in fqpr_inst.multibeam.raw_ping):
+            fqpr_inst.logger.info('****Skipping total uncertainty, tpu inputs are unchanged since the last run****\n')
+        else:
+            fqpr_inst.calculate_total_uncertainty()
+            fqpr_inst.write_attribute_to_ping_records({'tpu_signature': tpu_signature})
+            fqpr_inst.multibeam.reload_pingrecords(skip_dask=fqpr_inst.client is None)
 
-    # dask processes appear to suffer from memory leaks regardless of how carefully we track and wait on futures, reset the client here to clear memory after processing
-    if fqpr_inst.client is not None:
-        fqpr_inst.client.restart()
+    # dask processes appear to suffer from memory leaks regardless of how carefully we track and wait on futures, reset
+    #  the client here to clear memory after processing.  Only restart clients that kluster started, and only if the
+    #  workers are holding on to a significant amount of memory, restarting is a multi second operation
+    if fqpr_inst.client is not None and fqpr_inst.owns_client:
+        if get_cluster_memory_usage(fqpr_inst.client) > get_max_cluster_allocated_memory(fqpr_inst.client) * 0.5:
+            fqpr_inst.client.restart()
 
     return fqpr_inst
 
 
+def _tpu_signature(fqpr_inst: Fqpr):
+    """
+    Build a hash of the inputs that drive calculate_total_uncertainty, so that process_multibeam can skip the tpu
+    process when it has already been run with the same parameters on the same data.  Includes the motion latency,
+    the sound velocity casts and the state of the imported navigation, which all change the tpu result.  The inputs are
+    serialized to json (numpy values as lists) so that the signature is the same whether the inputs were built in
+    this session or reloaded from disk.
+
+    Parameters
+    ----------
+    fqpr_inst
+        Fqpr instance, must contain converted data
+
+    Returns
+    -------
+    str
+        md5 hex digest of the tpu inputs
+    """
+
+    cast_attrs = sorted((ky, val) for ky, val in fqpr_inst.multibeam.raw_ping[0].attrs.items()
+                        if ky.startswith(('profile_', 'attributes_')))
+    nav = fqpr_inst.navigation
+    if nav is not None:
+        nav_state = (nav.time.size, float(nav.time[0]), float(nav.time[-1]), sorted(nav.attrs.items()))
+    else:
+        nav_state = None
+    tpu_inputs = (fqpr_inst.multibeam.tpu_parameters, fqpr_inst.vert_ref, str(fqpr_inst.horizontal_crs),
+                  fqpr_inst.multibeam.xyzrph, fqpr_inst.motion_latency, fqpr_inst.navigation_path, nav_state,
+                  cast_attrs, [rp.time.size for rp in fqpr_inst.multibeam.raw_ping])
+    tpu_inputs = json.dumps(tpu_inputs, sort_keys=True, default=lambda x: x.tolist() if hasattr(x, 'tolist') else str(x))
+    return hashlib.md5(tpu_inputs.encode()).hexdigest()
+
+
 def process_and_export_soundings(filname: str, outfold: str = None, coord_system: str = 'NAD83', vert_ref: str = 'waterline'):
     """
     Use fqpr_generation to process multibeam data on the local cluster and generate a sound velocity corrected,
@@ -365,7 +447,7 @@ def return_georef_xyz(filname: str, coord_system: str = 'NAD83', vert_ref: str =
 
 
 def reload_data(converted_folder: str, require_raw_data: bool = True, skip_dask: bool = False, silent: bool = False,
-                show_progress: bool = True):
+                show_progress: bool = True, consolidated: bool = True):
     """
     Pick up from a previous session.  Load in all the data that exists for the session using the provided
     converted_folder.  Expects there to be fqpr generated zarr datastore folders in this folder.
@@ -389,6 +471,9 @@ def reload_data(converted_folder: str, require_raw_data: bool = True, skip_dask:
         if True, will not print messages
     show_progress
         If true, uses dask.distributed.progress.  Disabled for GUI, as it generates too much text
+    consolidated
+        if True, will open the zarr stores using their consolidated metadata, which kluster writes alongside the data.
+        Stores without consolidated metadata are opened normally.
 
     Returns
     -------
@@ -403,7 +488,8 @@ def reload_data(converted_folder: str, require_raw_data: bool = True, skip_dask:
     if (require_raw_data and final_paths['ping'] and final_paths['attitude'] and final_paths['navigation']) or (final_paths['ping'] or final_paths['soundings']):
         mbes_read = BatchRead(None, skip_dask=skip_dask, show_progress=show_progress)
         mbes_read.final_paths = final_paths
-        mbes_read.read_from_zarr_fils(final_paths['ping'], final_paths['attitude'][0], final_paths['navigation'][0], final_paths['logfile'])
+        mbes_read.read_from_zarr_fils(final_paths['ping'], final_paths['attitude'][0], final_paths['navigation'][0],
+                                      final_paths['logfile'], consolidated=consolidated)
         fqpr_inst = Fqpr(mbes_read, show_progress=show_progress)
         if not silent:
             fqpr_inst.logger.info('****Reloading from file {}****'.format(converted_folder))
@@ -430,6 +516,7 @@ def reload_data(converted_folder: str, require_raw_data: bool = True, skip_dask:
             if not silent:
                 print('No postprocessed navigation data found')
         fqpr_inst.client = mbes_read.client
+        fqpr_inst.owns_client = not skip_dask
     else:
         # not a valid zarr datastore
         if not silent:
@@ -520,7 +607,7 @@ def generate_new_surface(fqpr_inst: Union[Fqpr, list], max_points_per_quad: int
         fqpr_inst = [fqpr_inst]
 
     try:
-        all_have_soundings = np.all(['x' in rp for f in fqpr_inst for rp in f.multibeam.raw_ping])
+        all_have_soundings = all('x' in rp for f in fqpr_inst for rp in f.multibeam.raw_ping)
     except AttributeError:
         print('generate_new_vr_surface: Invalid Fqpr instances passed in, could not find instance.multibeam.raw_ping[0].x')
         return None
@@ -529,46 +616,55 @@ def generate_new_surface(fqpr_inst: Union[Fqpr, list], max_points_per_quad: int
         print('generate_new_vr_surface: No georeferenced soundings found')
         return None
 
-    unique_crs = []
-    unique_vertref = []
+    unique_crs = set()
+    unique_vertref = set()
+    first_pings = []  # the first raw_ping dataset of each fqpr instance, holds the attribution we need
     for fq in fqpr_inst:
-        crs_data = fq.horizontal_crs.to_epsg()
-        vertref = fq.multibeam.raw_ping[0].vertical_reference
-        if crs_data is None:
-            crs_data = fq.horizontal_crs.to_proj4()
-        if crs_data not in unique_crs:
-            unique_crs.append(crs_data)
-        if vertref not in unique_vertref:
-            unique_vertref.append(vertref)
+        horizontal_crs = fq.horizontal_crs
+        rp0 = fq.multibeam.raw_ping[0]
+        crs_data = horizontal_crs.to_epsg() or horizontal_crs.to_proj4()
+        unique_crs.add(crs_data)
+        unique_vertref.add(rp0.vertical_reference)
+        first_pings.append(rp0)
 
     if len(unique_crs) > 1:
-        print('generate_new_vr_surface: Found multiple EPSG codes in the input data, data must be of the same code: {}'.format(unique_crs))
+        print('generate_new_vr_surface: Found multiple EPSG codes in the input data, data must be of the same code: {}'.format(list(unique_crs)))
         return None
     if len(unique_vertref) > 1:
-        print('generate_new_vr_surface: Found multiple vertical references in the input data, data must be of the same reference: {}'.format(unique_vertref))
+        print('generate_new_vr_surface: Found multiple vertical references in the input data, data must be of the same reference: {}'.format(list(unique_vertref)))
         return None
     if not unique_crs and fqpr_inst:
         print('generate_new_vr_surface: No valid EPSG for {}'.format(fqpr_inst[0].horizontal_crs.to_proj4()))
         return None
 
     print('Preparing data...')
-    rps = []
-    for f in fqpr_inst:
-        for rp in f.multibeam.raw_ping:
-            rp = rp.drop_vars([nms for nms in rp.variables if nms not in ['x', 'y', 'z', 'tvu', 'thu']])
-            rps.append(rp)
-    if len(rps) == 1:
-        dataset = rp.drop_vars([nms for nms in rp.variables if nms not in ['x', 'y', 'z', 'tvu', 'thu']]).stack({'sounding': ('time', 'beam')})
-    else:
-        dataset = xr.concat(rps, dim='time', data_vars=['x', 'y', 'z', 'tvu', 'thu']).stack({'sounding': ('time', 'beam')})
-    dataset = dataset.compute()
+    # raw_ping datasets are lazy (dask backed zarr).  Flatten each (time, beam) variable and join them along the new
+    #  sounding dimension, a single layer per variable in the graph.  The tree only needs the values, so we skip the
+    #  time/beam MultiIndex that xarray stack would build.
+    rps = [rp for f in fqpr_inst for rp in f.multibeam.raw_ping]
+    data_vars = {}
+    for varname in kluster_variables.surface_variables:
+        if all(varname in rp for rp in rps):
+            flat_arrays = [da.asarray(rp[varname].data).reshape(-1) for rp in rps]
+            data_vars[varname] = ('sounding', flat_arrays[0] if len(flat_arrays) == 1 else da.concatenate(flat_arrays))
+    dataset = xr.Dataset(data_vars)
+    # z/tvu/thu are written as float32, make sure the concatenation did not promote them.  x/y stay float64 for precision
+    for varname in ['z', 'tvu', 'thu']:
+        if varname in dataset and dataset[varname].dtype != np.float32:
+            dataset[varname] = dataset[varname].astype(np.float32)
+    # leave the dataset lazy, QuadManager will load it once when converting to a structured array
+    if fqpr_inst[0].client is not None:
+        dataset = fqpr_inst[0].client.persist(dataset)
 
     print('Building tree...')
     qm = QuadManager()
-    coordsys = unique_crs[0]
-    vertref = unique_vertref[0]
-    containername = [os.path.split(f.multibeam.raw_ping[0].output_path)[1] for f in fqpr_inst]
-    multibeamlist = [list(f.multibeam.raw_ping[0].multibeam_files.keys()) for f in fqpr_inst]
+    coordsys = next(iter(unique_crs))
+    vertref = next(iter(unique_vertref))
+    containername = []
+    multibeamlist = []
+    for rp0 in first_pings:
+        containername.append(os.path.basename(rp0.output_path))
+        multibeamlist.append(list(rp0.multibeam_files))  # list, QuadManager extends these
     qm.create(dataset, container_name=containername, multibeam_file_list=multibeamlist, crs=coordsys,
               vertical_reference=vertref, max_points_per_quad=max_points_per_quad, max_grid_size=max_grid_size,
               min_grid_size=min_grid_size)
@@ -639,15 +735,24 @@ def return_processed_data_folders(converted_folder: str):
     """
 
     final_paths = {'attitude': [], 'navigation': [], 'ping': [], 'soundings': [], 'ppnav': [], 'logfile': ''}
+    record_keys = tuple(final_paths.keys())
     if os.path.isdir(converted_folder):
-        for fldr in os.listdir(converted_folder):
-            fldrpath = os.path.join(converted_folder, fldr)
-            for ky in list(final_paths.keys()):
-                if fldr.find(ky) != -1 and fldr.find('sync') == -1:  # exclude any sync folders from the zarr process file lock
-                    if os.path.isdir(fldrpath):
-                        final_paths[ky].append(fldrpath)
-                    elif ky in ['logfile']:
-                        final_paths[ky] = fldrpath
+        # scandir gives us the file type from the directory listing, so we avoid a stat call per entry
+        with os.scandir(converted_folder) as entries:
+            # exclude any sync folders from the zarr process file lock
+            candidates = [(entry, ky) for entry in entries if entry.name.find('sync') == -1
+                          for ky in record_keys if entry.name.find(ky) != -1]
+        if len(candidates) > 32:
+            # network shares do not always provide the file type in the listing, check many entries concurrently
+            with ThreadPoolExecutor(max_workers=32) as executor:
+                isdirs = list(executor.map(lambda cand: cand[0].is_dir(), candidates))
+        else:
+            isdirs = [entry.is_dir() for entry, ky in candidates]
+        for (entry, ky), isdir in zip(candidates, isdirs):
+            if isdir:
+                final_paths[ky].append(entry.path)
+            elif ky == 'logfile':
+                final_paths[ky] = entry.path
 
     for ky in ['attitude', 'navigation', 'soundings', 'ppnav']:
         if len(final_paths[ky]) > 1:
@@ -672,9 +777,9 @@ def reprocess_sounding_selection(fqpr_inst: Fqpr, new_xyzrph: dict = None, subse
     installation parameters entry applies.
 
     I've found that you can get up to a 6x speed increase by disabling dask.distributed for small datasets, which is
-    huge for something like this that might require many iterations with small time ranges.  I've yet to see a way
-    to skip the client/scheduler, so we brute force destroy it for now.  This takes a couple seconds, but shouldn't be
-    a big deal.
+    huge for something like this that might require many iterations with small time ranges.  With turn_off_dask, we
+    detach the client for the duration of this function and run on the local threaded scheduler, reattaching the
+    client when we are done.  The client itself is left running, so there is no teardown/startup cost.
 
     Parameters
     ----------
@@ -691,10 +796,11 @@ def reprocess_sounding_selection(fqpr_inst: Fqpr, new_xyzrph: dict = None, subse
         if True, will georeference the soundings, else will return the vessel coordinate system aligned sv corrected
         offsets (forward, starboard, down)
     turn_off_dask
-        if True, close the client and destroy it.  Just closing doesn't work, as it retains the scheduler,
-        which will try and find workers that don't exist when you run a process
+        if True, skip the dask.distributed client and process with the local threaded scheduler.  The client is
+        reattached to the fqpr instance when processing is complete.
     turn_dask_back_on
-        if True, will restart the client by reloading data if the client does not exist
+        deprecated, the client is no longer destroyed with turn_off_dask.  If True, will start a client by reloading
+        data if the fqpr instance did not have a client to begin with
     override_datum
         datum identifier if soundings does not exist, will prefer this over the soundings information
     override_vertical_reference
@@ -706,17 +812,21 @@ def reprocess_sounding_selection(fqpr_inst: Fqpr, new_xyzrph: dict = None, subse
         instance or list of instances of fqpr_generation.Fqpr class that contains generated soundings data
     list
         list of numpy arrays, [x (easting in meters), y (northing in meters), z (depth pos down in meters),
-        tstmp (xyzrph timestamp for each sounding)
+        tstmp (xyzrph timestamp for each sounding, as float)
     """
 
     if 'horizontal_crs' not in fqpr_inst.multibeam.raw_ping[0].attrs and georeference:
         raise ValueError('horizontal_crs object not found.  Please run Fqpr.construct_crs first')
     if 'vertical_reference' not in fqpr_inst.multibeam.raw_ping[0].attrs and georeference:
         raise NotImplementedError('set_vertical_reference must be run before georeferencing')
-    if turn_off_dask and fqpr_inst.client is not None:
-        fqpr_inst.client.close()
+
+    dask_client = fqpr_inst.client
+    if turn_off_dask and dask_client is not None:
+        # detach the client so that Fqpr runs locally, and keep any dask operations off of the distributed scheduler
         fqpr_inst.client = None
-        fqpr_inst = reload_data(os.path.dirname(fqpr_inst.multibeam.final_paths['ping'][0]), skip_dask=True)
+        scheduler_context = dask.config.set(scheduler='threads')
+    else:
+        scheduler_context = nullcontext()
 
     if new_xyzrph is not None:
         fqpr_inst.multibeam.xyzrph = new_xyzrph
@@ -728,47 +838,90 @@ def reprocess_sounding_selection(fqpr_inst: Fqpr, new_xyzrph: dict = None, subse
         if type(subset_time[0]) is not list:  # fix for when user provides just a list of floats [start,end]
             subset_time = [subset_time]
 
-    fqpr_inst.get_orientation_vectors(subset_time=subset_time, dump_data=False)
-    fqpr_inst.get_beam_pointing_vectors(subset_time=subset_time, dump_data=False)
-    fqpr_inst.sv_correct(subset_time=subset_time, dump_data=False)
-    if georeference:
-        if override_datum is not None:
-            datum = override_datum
-            epsg = None
-        else:
-            datum = None
-            epsg = fqpr_inst.multibeam.raw_ping[0].horizontal_crs
-
-        fqpr_inst.construct_crs(epsg=epsg, datum=datum)
-        fqpr_inst.georef_xyz(subset_time=subset_time, dump_data=False)
-        data_store = 'xyz'
-    else:
-        data_store = 'sv_corr'
-
-    soundings = [[], [], [], []]
-    for sector in fqpr_inst.intermediate_dat:
-        if data_store in fqpr_inst.intermediate_dat[sector]:
-            for tstmp in fqpr_inst.intermediate_dat[sector][data_store]:
-                dat = fqpr_inst.intermediate_dat[sector][data_store][tstmp]
-                for d in dat:
-                    x_vals = np.ravel(d[0][0])
-                    y_vals = np.ravel(d[0][1])
-                    z_vals = np.ravel(d[0][2])
-                    idx = ~np.isnan(x_vals)
-                    soundings[0].append(x_vals[idx])
-                    soundings[1].append(y_vals[idx])
-                    soundings[2].append(z_vals[idx])
-                    soundings[3].append([tstmp] * len(z_vals[idx]))
-        else:
-            print('No soundings found for {}'.format(sector))
+    try:
+        with scheduler_context:
+            if georeference:
+                if override_datum is not None:
+                    datum = override_datum
+                    epsg = None
+                else:
+                    datum = None
+                    epsg = fqpr_inst.multibeam.raw_ping[0].horizontal_crs
+                fqpr_inst.construct_crs(epsg=epsg, datum=datum)
+            sounding_records = fqpr_inst.pipeline(subset_time=subset_time, georeference=georeference)
+    finally:
+        fqpr_inst.client = dask_client
+    soundings = [sounding_records['x'], sounding_records['y'], sounding_records['z'], sounding_records['tstmp']]
 
-    soundings = [np.concatenate(s, axis=0) for s in soundings]
     if turn_dask_back_on and fqpr_inst.client is None:
         fqpr_inst = reload_data(os.path.dirname(fqpr_inst.multibeam.final_paths['ping'][0]))
     return fqpr_inst, soundings
 
 
-def xyz_from_allfile(filname: str):
+def _permute_rows(perm: np.array, arrays: list):
+    """
+    Reorder the rows of each array in place with the given permutation.  All arrays must share the same shape and
+    dtype, a single scratch buffer is allocated and reused for all of them, instead of a new array per fancy index.
+
+    Parameters
+    ----------
+    perm
+        numpy array, permutation of the first dimension, i.e. the result of np.argsort
+    arrays
+        list of numpy arrays to reorder in place
+    """
+
+    scratch = np.empty_like(arrays[0])
+    for arr in arrays:
+        np.take(arr, perm, axis=0, out=scratch)
+        arr[:] = scratch
+
+
+def _tx_delays_from_allfile(filname: str, pfil: AllRead, num78: int):
+    """
+    Return the transmit delay of the first sector (Delay[0]) for the first num78 raw range and angle (78) records.
+    The delay sits at a fixed position in the 78 datagram, so we pull it straight out of the file at each record
+    offset, instead of decoding every 78 record with par.  The position and byte order are checked against the par
+    decoded records at evenly spaced indices (all of them for small files), falling back to decoding each record if
+    they do not match.
+
+    Parameters
+    ----------
+    filname
+        str, path to .all file
+    pfil
+        par AllRead instance for the file, with the map built (see AllRead.mapfile)
+    num78
+        number of 78 records to read
+
+    Returns
+    -------
+    np.array
+        numpy array of the first sector transmit delay for each 78 record
+    """
+
+    if num78 == 0:
+        return np.zeros(0)
+    getrec = pfil.getrecord
+    check_idx = np.unique(np.linspace(0, num78 - 1, min(num78, _tx_delay_check_count)).astype(np.int64))
+    expected = np.array([getrec(78, int(i)).tx_data.Delay[0] for i in check_idx])
+    offsets = np.array([int(rec[0]) for rec in pfil.map.packdir['78'][:num78]], dtype=np.int64)
+    raw = np.memmap(filname, dtype=np.uint8, mode='r')
+    # 20 byte header + 16 bytes of ping info + 8 bytes into the first tx sector, with or without the length field
+    for delay_position in [44, 40]:
+        positions = offsets[:, None] + delay_position + np.arange(4)
+        if positions[-1, -1] >= raw.shape[0]:
+            continue
+        delay_bytes = np.ascontiguousarray(raw[positions])
+        for byte_order in ['<f4', '>f4']:
+            delays = delay_bytes.view(byte_order).ravel().astype(np.float64)
+            if np.allclose(delays[check_idx], expected):
+                return delays
+    logger.warning('_tx_delays_from_allfile: unable to read delays directly from {}, decoding each 78 record'.format(filname))
+    return np.array([getrec(78, i).tx_data.Delay[0] for i in range(num78)])
+
+
+def xyz_from_allfile(filname: str, dtype: type = np.float32):
     """
     function using par to pull out the xyz88 datagram and return the xyz for each ping.  Times returned are a sum of
     ping time and delay time (to match Kluster, I do this so that times are unique across sector identifiers).
@@ -777,6 +930,9 @@ def xyz_from_allfile(filname: str):
     ----------
     filname
         str, path to .all file
+    dtype
+        numpy dtype for the alongtrack/acrosstrack/depth arrays, float32 is plenty for the xyz88 precision.  Times are
+        always float64
 
     Returns
     -------
@@ -795,41 +951,92 @@ def xyz_from_allfile(filname: str):
     pfil = AllRead(filname)
     pfil.mapfile()
     num88 = len(pfil.map.packdir['88'])
+    # truncated files/logging stopped mid ping can have fewer 78 records than 88 records, only read the pings with both
+    numrecs = min(num88, len(pfil.map.packdir['78']))
     numbeams = pfil.getrecord(88, 0).data['Depth'].shape[0]
 
-    dpths = np.zeros((num88, numbeams))
-    xs = np.zeros((num88, numbeams))
-    ys = np.zeros((num88, numbeams))
+    dpths = np.zeros((num88, numbeams), dtype=dtype)
+    xs = np.zeros((num88, numbeams), dtype=dtype)
+    ys = np.zeros((num88, numbeams), dtype=dtype)
     tms = np.zeros(num88)
     cntrs = np.zeros(num88)
 
-    for i in range(num88):
-        try:
-            rec88 = pfil.getrecord(88, i)
-            rec78 = pfil.getrecord(78, i)
+    # gather the xyz88 records in one pass, then pull each field out of the stacked records as a block
+    data88 = []
+    getrec = pfil.getrecord
+    append_data88 = data88.append
+    delays = _tx_delays_from_allfile(filname, pfil, numrecs)
+    for i in range(numrecs):
+        rec88 = getrec(88, i)
+        append_data88(rec88.data)
+        tms[i] = rec88.time + delays[i]  # match par sequential_read, ping time = timestamp + delay
+        cntrs[i] = rec88.Counter
+
+    if data88:
+        data88 = np.stack(data88)
+        dpths[:numrecs] = data88['Depth']
+        ys[:numrecs] = data88['AcrossTrack']
+        xs[:numrecs] = data88['AlongTrack']
 
-            dpths[i, :] = rec88.data['Depth']
-            ys[i, :] = rec88.data['AcrossTrack']
-            xs[i, :] = rec88.data['AlongTrack']
-            tms[i] = rec88.time + rec78.tx_data.Delay[0]  # match par sequential_read, ping time = timestamp + delay
-            cntrs[i] = rec88.Counter
+    # ideally this would do it, but we have to sort by prim/stbd arrays when cntr/times are equal between heads for dual head
+    cntrsorted = np.argsort(cntrs, kind='stable')
+    _permute_rows(cntrsorted, [xs, ys, dpths])
+    _permute_rows(cntrsorted, [tms, cntrs])
 
-        except IndexError:
-            break
+    return xs, ys, dpths, tms, cntrs
 
-    # ideally this would do it, but we have to sort by prim/stbd arrays when cntr/times are equal between heads for dual head
-    cntrsorted = np.argsort(cntrs)
 
-    tms = tms[cntrsorted]
-    xs = xs[cntrsorted]
-    ys = ys[cntrsorted]
-    dpths = dpths[cntrsorted]
-    cntrs = cntrs[cntrsorted]
+def _decode_mrz_block(filname: str, offsets: np.array, rows: np.array, tx_vert: float, xs: np.array, ys: np.array,
+                      dpths: np.array, tms: np.array, cntrs: np.array):
+    """
+    Decode the MRZ records at the given byte offsets and write them to the given rows of the preallocated arrays.  Opens
+    a separate kmall reader/file handle, so that xyz_from_kmallfile can run several of these at once.
 
-    return xs, ys, dpths, tms, cntrs
+    Parameters
+    ----------
+    filname
+        str, path to .kmall file
+    offsets
+        numpy array, byte offsets for the MRZ records to read
+    rows
+        numpy array, row index in the output arrays for each offset
+    tx_vert
+        transducer 1 vertical location from the installation parameters, removed from the depths
+    xs
+        2d numpy array (time, beam) of the alongtrack offsets, filled in place
+    ys
+        2d numpy array (time, beam) of the acrosstrack offsets, filled in place
+    dpths
+        2d numpy array (time, beam) of the depth offsets, filled in place
+    tms
+        numpy array of the times, filled in place
+    cntrs
+        numpy array of the ping counters, filled in place
 
+    Returns
+    -------
+    int
+        number of records read
+    """
 
-def xyz_from_kmallfile(filname: str):
+    km = kmall(filname)
+    with open(filname, 'rb') as fid:
+        km.FID = fid
+        for offset, row in zip(offsets, rows):
+            fid.seek(int(offset), 0)
+            dg = km.read_EMdgmMRZ()
+            # assign the sounding lists straight into the preallocated rows, no intermediate arrays
+            xs[row, :] = dg['sounding']['x_reRefPoint_m']
+            ys[row, :] = dg['sounding']['y_reRefPoint_m']
+            dpths[row, :] = dg['sounding']['z_reRefPoint_m']
+            dpths[row, :] -= tx_vert
+            tms[row] = dg['header']['dgtime']
+            cntrs[row] = dg['cmnPart']['pingCnt']
+        km.FID = None
+    return len(rows)
+
+
+def xyz_from_kmallfile(filname: str, dtype: type = np.float32):
     """
     function using kmall to pull out the xyz88 datagram and return the xyz for each ping.  Times returned are a sum of
     ping time and delay time (to match Kluster, I do this so that times are unique across sector identifiers).
@@ -841,6 +1048,9 @@ def xyz_from_kmallfile(filname: str):
     ----------
     filname
         str, path to .all file
+    dtype
+        numpy dtype for the alongtrack/acrosstrack/depth arrays, float32 is plenty for the MRZ precision.  Times are
+        always float64
 
     Returns
     -------
@@ -858,46 +1068,40 @@ def xyz_from_kmallfile(filname: str):
 
     km = kmall(filname)
     km.index_file()
-    numpings = km.Index['MessageType'].value_counts()["b'#MRZ'"]
+    # pull the index columns out as numpy arrays, rather than iterating over the pandas Series
+    mrz_offsets = km.Index['ByteOffset'].to_numpy()[km.Index['MessageType'].to_numpy() == "b'#MRZ'"]
+    numpings = mrz_offsets.size
     numbeams = len(km.read_first_datagram('MRZ')['sounding']['z_reRefPoint_m'])
 
-    dpths = np.zeros((numpings, numbeams))
-    xs = np.zeros((numpings, numbeams))
-    ys = np.zeros((numpings, numbeams))
+    dpths = np.zeros((numpings, numbeams), dtype=dtype)
+    xs = np.zeros((numpings, numbeams), dtype=dtype)
+    ys = np.zeros((numpings, numbeams), dtype=dtype)
     tms = np.zeros(numpings)
     cntrs = np.zeros(numpings)
 
     install = km.read_first_datagram('IIP')
-    read_count = 0
-    for offset, size, mtype in zip(km.Index['ByteOffset'],
-                                   km.Index['MessageSize'],
-                                   km.Index['MessageType']):
-        km.FID.seek(offset, 0)
-        if mtype == "b'#MRZ'":
-            dg = km.read_EMdgmMRZ()
-            xs[read_count, :] = np.array(dg['sounding']['x_reRefPoint_m'])
-            ys[read_count, :] = np.array(dg['sounding']['y_reRefPoint_m'])
-            # we want depths rel tx to align with our sv correction output
-            dpths[read_count, :] = np.array(dg['sounding']['z_reRefPoint_m']) - \
-                float(install['install_txt']['transducer_1_vertical_location'])
-            tms[read_count] = dg['header']['dgtime']
-            cntrs[read_count] = dg['cmnPart']['pingCnt']
-            read_count += 1
+    # we want depths rel tx to align with our sv correction output
+    tx_vert = float(install['install_txt']['transducer_1_vertical_location'])
+
+    # decode the MRZ records in parallel, each worker gets its own reader/file handle and a contiguous block of rows
+    max_workers = min(os.cpu_count() or 1, max(len(mrz_offsets), 1))
+    blocks = np.array_split(np.arange(len(mrz_offsets)), max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futs = [executor.submit(_decode_mrz_block, filname, mrz_offsets[rows], rows, tx_vert,
+                                xs, ys, dpths, tms, cntrs) for rows in blocks]
+        read_count = sum([f.result() for f in futs])
 
     if read_count != numpings:
         raise ValueError('kmall index count for MRZ records does not match actual records read')
-    cntrsorted = np.argsort(cntrs)  # ideally this would do it, but we have to sort by prim/stbd arrays when cntr/times
-    # are equal between heads for dual head
-    tms = tms[cntrsorted]
-    xs = xs[cntrsorted]
-    ys = ys[cntrsorted]
-    dpths = dpths[cntrsorted]
-    cntrs = cntrs[cntrsorted]
+    cntrsorted = np.argsort(cntrs, kind='stable')  # ideally this would do it, but we have to sort by prim/stbd arrays
+    # when cntr/times are equal between heads for dual head
+    _permute_rows(cntrsorted, [xs, ys, dpths])
+    _permute_rows(cntrsorted, [tms, cntrs])
 
     return xs, ys, dpths, tms, cntrs
 
 
-def _dual_head_sort(idx: int, my_y: np.array, kongs_y: np.array, prev_index: int):
+def _dual_head_sort(idx: int, my_y_mean: np.array, kongs_y_mean: np.array, prev_index: int):
     """
     Big ugly check to see if the par found xyz88 records are in alternating port head/stbd head (or stbd head/port head)
     order.  Important because we want to compare the result side by side with the Kluster sv corrected data.
@@ -909,10 +1113,10 @@ def _dual_head_sort(idx: int, my_y: np.array, kongs_y: np.array, prev_index: int
     ----------
     idx
         int, index for the par/kluster records
-    my_y
-        numpy array, acrosstrack 2d (ping, beam) from kluater/fqpr_generation sv correction
-    kongs_y
-        numpy array, acrosstrack 2d (ping, beam) from par xyz88 read
+    my_y_mean
+        numpy array, mean acrosstrack value for each ping from kluater/fqpr_generation sv correction
+    kongs_y_mean
+        numpy array, mean acrosstrack value for each ping from par xyz88 read
     prev_index
         int, feedback from previous run of _dual_head_sort to guide the surrounding search
 
@@ -924,76 +1128,96 @@ def _dual_head_sort(idx: int, my_y: np.array, kongs_y: np.array, prev_index: int
         feedback for next run
     """
 
-    ki = idx
-    my_port = my_y[idx].mean()
-    kongs_port = kongs_y[idx].mean()
-
-    my_port = my_port < 0
-    kongs_port = kongs_port < 0
-    if not my_port == kongs_port:
+    if (my_y_mean[idx] < 0) != (kongs_y_mean[idx] < 0):
         print('Found ping that doesnt line up with par, checking nearby pings (should only occur with dual head)')
-        found = False
-        potential_idxs = [-prev_index, 1, -1, 2, -2]
-        for pot_idx in potential_idxs:
-            try:
-                kongs_port = kongs_y[idx + pot_idx].mean() < 0
-                if kongs_port == my_port:
-                    found = True
-                    ki = idx + pot_idx
-                    prev_index = pot_idx
-                    print('- Adjusting {} to {} for par index'.format(idx, ki))
-                    break
-            except IndexError:
-                print('_dual_head_sort: Reached end of par xyz88 records')
-        if not found:
-            raise ValueError('Found ping at {} that does not appear to match nearby kluster processed pings'.format(idx))
+    found, ki, prev_index = dual_head_match(float(my_y_mean[idx]), kongs_y_mean, int(idx), int(prev_index))
+    if not found:
+        raise ValueError('Found ping at {} that does not appear to match nearby kluster processed pings'.format(idx))
+    if ki != idx:
+        print('- Adjusting {} to {} for par index'.format(idx, ki))
     return ki, prev_index
 
 
-def _single_head_sort(idx: int, my_x: np.array, kongs_x: np.array):
+def _single_head_sort(idx: np.array, my_x_mean: np.array, kongs_x_mean: np.array):
     """
     Big ugly check to see if the par found xyz88 records are in alternating port head/stbd head (or stbd head/port head)
     order.  Important because we want to compare the result side by side with the Kluster sv corrected data.
 
-    Idea here is to check the mean across track value and see if it is on the left or right (positive or negative).
-    If the Kluster is on the left and the par is on the right, look at the surrounding recs to fix the order.
+    Idea here is to check the mean along track value of each ping against the par records at the same index and the
+    records on either side, and take the closest one.
 
     Parameters
     ----------
     idx
-        int, index for the par/kluster records
-    my_x
-        numpy array, acrosstrack 2d (ping, beam) from kluater/fqpr_generation sv correction
-    kongs_x
-        numpy array, acrosstrack 2d (ping, beam) from par xyz88 read
+        numpy array, indices for the par/kluster records
+    my_x_mean
+        numpy array, mean alongtrack value for each ping from kluater/fqpr_generation sv correction
+    kongs_x_mean
+        numpy array, mean alongtrack value for each ping from par xyz88 read
 
     Returns
     -------
-    int
-        corrected index for port/stbd head order in par module xyz88
-    int
-        feedback for next run
+    np.array
+        corrected indices for port/stbd head order in par module xyz88
     """
 
-    my_alongtrack = float(my_x[idx].mean())
-    kongs_alongtrack = kongs_x[idx].mean()
+    idx = np.asarray(idx)
+    # pad with a value that will never be closest, so that the records before the first/after the last are not chosen
+    padded = np.concatenate([[999], kongs_x_mean, [999]])
+    candidates = np.stack([padded[idx + 1], padded[idx], padded[idx + 2]], axis=1)  # idx, idx - 1, idx + 1
+    closest_index = np.argmin(np.abs(my_x_mean[idx][:, None] - candidates), axis=1)
+    return idx + np.array([0, -1, 1])[closest_index]
 
-    previous_index = idx - 1
-    if previous_index >= 0:
-        kongs_alongtrack_pre = kongs_x[idx-1].mean()
-    else:
-        kongs_alongtrack_pre = 999
 
-    post_index = idx + 1
-    if post_index < kongs_x.shape[0]:
-        kongs_alongtrack_post = kongs_x[idx+1].mean()
-    else:
-        kongs_alongtrack_post = 999
+def _dual_ping_mask(kongs_tm: np.array, idx: np.array):
+    """
+    Return True for each index where the par xyz88 record time differs from the record before or after it, i.e. the
+    records that might be out of order between the pings of a dual ping and need _single_head_sort.  The neighbours of
+    the first/last record are clipped to the record itself, so indices at either end of the file are valid.
+
+    Parameters
+    ----------
+    kongs_tm
+        numpy array of the times from the xyz88 record
+    idx
+        numpy array, indices for the par/kluster records
+
+    Returns
+    -------
+    np.array
+        boolean numpy array, True where the record at that index is part of a dual ping
+    """
 
-    closest_index = np.argmin(np.abs(my_alongtrack - np.array([kongs_alongtrack, kongs_alongtrack_pre, kongs_alongtrack_post])))
-    correct_idx = [idx, idx - 1, idx + 1][closest_index]
+    idx = np.asarray(idx)
+    lastidx = kongs_tm.shape[0] - 1
+    prev_tm = kongs_tm[np.clip(idx - 1, 0, lastidx)]
+    next_tm = kongs_tm[np.clip(idx + 1, 0, lastidx)]
+    return (np.abs(prev_tm - kongs_tm[idx]) > 0.01) | (np.abs(next_tm - kongs_tm[idx]) > 0.01)
 
-    return correct_idx
+
+def _plot_ping_collection(ax: plt.Axes, curves: np.ndarray, colors: list):
+    """
+    Plot each ping (row) of the 2d (ping, beam) array as a line against beam number, using a single LineCollection
+    for the axes rather than one plot call per ping.
+
+    Parameters
+    ----------
+    ax
+        matplotlib axes to plot to
+    curves
+        2d numpy array (ping, beam) of the values to plot
+    colors
+        list of colors, one for each ping
+    """
+
+    beams = np.broadcast_to(np.arange(curves.shape[1]), curves.shape)
+    ax.add_collection(LineCollection(np.stack([beams, curves], axis=-1), colors=colors))
+    ax.set_xlim(0, max(curves.shape[1] - 1, 1))
+    if np.isfinite(curves).any():
+        minval, maxval = np.nanmin(curves), np.nanmax(curves)
+        if minval == maxval:
+            minval, maxval = minval - 1, maxval + 1
+        ax.set_ylim(minval, maxval)
 
 
 def validation_against_xyz88(filname: str, analysis_mode: str = 'even', numplots: int = 10,
@@ -1035,19 +1259,26 @@ def validation_against_xyz88(filname: str, analysis_mode: str = 'even', numplots
         raise NotImplementedError('Only .all and .kmall file types are supported')
     print('Reading and processing from raw raw_ping/.all file with Kluster...')
     fq, dset = return_svcorr_xyz(filname, visualizations=visualizations)
+    # load the kluster offsets once, indexing the dask backed dataset per ping would compute each ping separately.  Match
+    #   the precision of the xyz88 arrays so the differences are not upcast
+    my_x = np.asarray(dset.alongtrack, dtype=kongs_x.dtype)
+    my_y = np.asarray(dset.acrosstrack, dtype=kongs_y.dtype)
+    my_z = np.asarray(dset.depthoffset, dtype=kongs_z.dtype)
 
     print('Plotting...')
     if kongs_tm[0] == 0.0:
         # seen this with EM710 data, the xyz88 dump has zeros arrays at the start, find the first nonzero time
         #    (assuming it starts in the first 100 times)
         print('Found empty arrays in xyz88, seems common with EM710 data')
-        first_nonzero = np.where(kongs_tm[:100] != 0.0)[0][0]
+        first_nonzero = int(np.argmax(kongs_tm[:100] != 0.0))
+        if kongs_tm[first_nonzero] == 0.0:
+            raise ValueError('Unable to find a nonzero time in the first 100 xyz88 records')
         kongs_x = kongs_x[first_nonzero:]
         kongs_y = kongs_y[first_nonzero:]
         kongs_z = kongs_z[first_nonzero:]
         kongs_tm = kongs_tm[first_nonzero:]
-    if kongs_x.shape != dset.alongtrack.shape:
-        print('Found incompatible par/Kluster data sets.  Kluster x shape {}, par x shape {}'.format(dset.alongtrack.shape,
+    if kongs_x.shape != my_x.shape:
+        print('Found incompatible par/Kluster data sets.  Kluster x shape {}, par x shape {}'.format(my_x.shape,
                                                                                                      kongs_x.shape))
     if fq.multibeam.is_dual_head():
         print('WANRING: I have not figured out the comparison of xyz88/kluster generated data with dual head systems.' +
@@ -1082,23 +1313,34 @@ def validation_against_xyz88(filname: str, analysis_mode: str = 'even', numplots
     acrossdif_plt.set_title('Kluster/XYZ88 Acrosstrack Difference')
     zvaldif_plt.set_title('Kluster/XYZ88 Vertical Difference')
 
-    lbls = []
-    prev_index = 0
-    for i in idx:
-        if fq.multibeam.is_dual_head():
-            ki, prev_index = _dual_head_sort(i, dset.acrosstrack, kongs_y, prev_index)
-        elif (np.abs(kongs_tm[i - 1] - kongs_tm[i]) > 0.01) or (np.abs(kongs_tm[i + 1] - kongs_tm[i]) > 0.01):  # dual ping
-            ki = _single_head_sort(i, dset.alongtrack, kongs_x)
-        else:
-            ki = i
-        lbls.append(kongs_tm[ki])
-        myz_plt.plot(dset.depthoffset[i])
-        kongsz_plt.plot(kongs_z[ki])
-        alongdif_plt.plot(dset.alongtrack[i] - kongs_x[ki])
-        acrossdif_plt.plot(dset.acrosstrack[i] - kongs_y[ki])
-        zvaldif_plt.plot(dset.depthoffset[i] - kongs_z[ki])
-
-    myz_plt.legend(labels=lbls, bbox_to_anchor=(1.05, 1), loc="upper left")
+    # match each kluster ping to the par record, using the mean along/across track value of each ping
+    if fq.multibeam.is_dual_head():
+        my_y_mean = np.nanmean(my_y, axis=1)
+        kongs_y_mean = kongs_y.mean(axis=1)
+        kidx = np.array(idx)
+        # only the pings where the heads do not line up need the search through the surrounding records
+        mismatch = np.where((my_y_mean[idx] < 0) != (kongs_y_mean[idx] < 0))[0]
+        prev_index = 0
+        for cnt in mismatch:
+            kidx[cnt], prev_index = _dual_head_sort(idx[cnt], my_y_mean, kongs_y_mean, prev_index)
+    else:
+        my_x_mean = np.nanmean(my_x, axis=1)
+        kongs_x_mean = kongs_x.mean(axis=1)
+        dual_ping = _dual_ping_mask(kongs_tm, idx)
+        kidx = np.where(dual_ping, _single_head_sort(idx, my_x_mean, kongs_x_mean), idx)
+
+    # one collection per subplot instead of a plot call per ping
+    lbls = list(kongs_tm[kidx])
+    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = [colors[cnt % len(colors)] for cnt in range(len(idx))]
+    _plot_ping_collection(myz_plt, my_z[idx], colors)
+    _plot_ping_collection(kongsz_plt, kongs_z[kidx], colors)
+    _plot_ping_collection(alongdif_plt, my_x[idx] - kongs_x[kidx], colors)
+    _plot_ping_collection(acrossdif_plt, my_y[idx] - kongs_y[kidx], colors)
+    _plot_ping_collection(zvaldif_plt, my_z[idx] - kongs_z[kidx], colors)
+
+    myz_plt.legend(handles=[Line2D([0], [0], color=c) for c in colors], labels=lbls, bbox_to_anchor=(1.05, 1),
+                   loc="upper left")
     if export:
         plt.tight_layout()
         plt.savefig(export)
@@ -1205,17 +1447,80 @@ def get_attributes_from_zarr_stores(list_dir_paths: list):
         list of dicts for each successfully reloaded fqpr object
     """
 
+    def _store_attributes(pth: str):
+        return _cached_attributes_from_zarr_store(pth, _zarr_attributes_modified_time(pth))
+
+    if len(list_dir_paths) > 1:
+        # reloading is mostly waiting on disk, reload the stores concurrently
+        with ThreadPoolExecutor(max_workers=min(len(list_dir_paths), 8)) as executor:
+            store_attrs = list(executor.map(_store_attributes, list_dir_paths))
+    else:
+        store_attrs = [_store_attributes(pth) for pth in list_dir_paths]
+
     attrs = []
-    for pth in list_dir_paths:
-        fqpr_instance = reload_data(pth, skip_dask=True)
-        if fqpr_instance is not None:
-            newattrs = get_attributes_from_fqpr(fqpr_instance)
-            attrs.append(newattrs)
+    for newattrs in store_attrs:
+        if newattrs is not None:
+            # copy so that the caller can not alter the cached attributes
+            attrs.append(copy.deepcopy(newattrs))
         else:
             attrs.append([None])
     return attrs
 
 
+def _zarr_attributes_modified_time(pth: str):
+    """
+    Return the last modified time of the attributes (.zattrs) across all the zarr stores in the given converted folder.
+    Used as the cache key for _cached_attributes_from_zarr_store, so that the cache is invalidated whenever any of the
+    stores are written to.
+
+    Parameters
+    ----------
+    pth
+        path to the converted folder containing the zarr folders
+
+    Returns
+    -------
+    float
+        latest modified time of the .zattrs files, None if none are found
+    """
+
+    mtimes = []
+    if os.path.isdir(pth):
+        with os.scandir(pth) as entries:
+            for entry in entries:
+                zattrs = os.path.join(entry.path, '.zattrs')
+                if entry.is_dir() and os.path.exists(zattrs):
+                    mtimes.append(os.path.getmtime(zattrs))
+    if mtimes:
+        return max(mtimes)
+    return None
+
+
+@lru_cache(maxsize=256)
+def _cached_attributes_from_zarr_store(pth: str, modified_time: float):
+    """
+    Reload the fqpr instance at the given path and return the attributes, see get_attributes_from_fqpr.  Cached on the
+    path and the modified time of the zarr attributes, see _zarr_attributes_modified_time.
+
+    Parameters
+    ----------
+    pth
+        path to the converted folder containing the zarr folders
+    modified_time
+        latest modified time of the .zattrs files in the converted folder
+
+    Returns
+    -------
+    dict
+        dict of attributes in that FQPR instance, None if unable to reload
+    """
+
+    fqpr_instance = reload_data(pth, skip_dask=True)
+    if fqpr_instance is not None:
+        return get_attributes_from_fqpr(fqpr_instance)
+    return None
+
+
 def get_attributes_from_fqpr(fqpr_instance, include_mode: bool = True):
     """
     Takes in a FQPR instance.  Returns a dict of the attribution in that instance.  Prefers the attributes from the
@@ -1238,11 +1543,6 @@ def get_attributes_from_fqpr(fqpr_instance, include_mode: bool = True):
         dict of attributes in that FQPR instance
     """
 
-    mode_translator = {'vsCW': 'CW_veryshort', 'shCW': 'CW_short', 'meCW': 'CW_medium', 'loCW': 'CW_long',
-                       'vlCW': 'CW_verylong', 'elCW': 'CW_extralong', 'shFM': 'FM_short', 'loFM': 'FM_long',
-                       '__FM': 'FM', 'FM': 'FM', 'CW': 'CW', 'VS': 'VeryShallow', 'SH': 'Shallow', 'ME': 'Medium',
-                       'DE': 'Deep', 'VD': 'VeryDeep', 'ED': 'ExtraDeep'}
-
     if 'xyz_dat' in fqpr_instance.__dict__:
         if fqpr_instance.soundings is not None:
             newattrs = fqpr_instance.soundings.attrs.copy()
@@ -1256,27 +1556,24 @@ def get_attributes_from_fqpr(fqpr_instance, include_mode: bool = True):
         for other_attrs in [fqpr_instance.multibeam.raw_nav.attrs, fqpr_instance.multibeam.raw_att.attrs]:
             for k, v in other_attrs.items():
                 if k not in newattrs:
-                    try:
-                        newattrs[k] = v
-                    except:
-                        print('unable to add {}'.format(k))
+                    newattrs[k] = v
                 elif isinstance(newattrs[k], list):
-                    try:
+                    if isinstance(v, (list, tuple)):
                         for sub_att in v:
                             if sub_att not in newattrs[k]:
                                 newattrs[k].append(sub_att)
-                    except:
+                    else:
                         print('unable to append {}'.format(k))
                 elif isinstance(newattrs[k], dict):
-                    try:
+                    if isinstance(v, dict):
                         newattrs[k].update(v)
-                    except:
+                    else:
                         print('Unable to update {}'.format(k))
     except AttributeError:
         print('Unable to read from Navigation')
 
     if include_mode:
-        translated_mode = [mode_translator[a] for a in fqpr_instance.return_unique_mode()]
+        translated_mode = [kluster_variables.mode_translator[a] for a in fqpr_instance.return_unique_mode()]
         newattrs['mode'] = str(translated_mode)
     return newattrs
 
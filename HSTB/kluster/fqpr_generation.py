@@ -15,11 +15,11 @@ from HSTB.kluster.modules.svcorrect import get_sv_files_from_directory, return_s
     distributed_run_sv_correct, cast_data_from_file
 from HSTB.kluster.modules.georeference import distrib_run_georeference, datum_to_wkt, vyperdatum_found
 from HSTB.kluster.modules.tpu import distrib_run_calculate_tpu
-from HSTB.kluster.xarray_conversion import BatchRead
+from HSTB.kluster.xarray_conversion import BatchRead, normalize_subset_time
 from HSTB.kluster.modules.visualizations import FqprVisualizations
 from HSTB.kluster.modules.export import FqprExport
 from HSTB.kluster.xarray_helpers import combine_arrays_to_dataset, compare_and_find_gaps, divide_arrays_by_time_index, \
-    interp_across_chunks, reload_zarr_records, slice_xarray_by_dim, stack_nan_array, get_beamwise_interpolation
+    interp_across_chunks, reload_zarr_records, slice_xarray_by_dim, stack_nan_array_flat, get_beamwise_interpolation
 from HSTB.kluster.backends._zarr import ZarrBackend
 from HSTB.kluster.dask_helpers import dask_find_or_start_client, get_number_of_workers
 from HSTB.kluster.fqpr_helpers import build_crs
@@ -80,6 +80,7 @@ class Fqpr(ZarrBackend):
         self.parallel_write = parallel_write
 
         self.client = None
+        self.owns_client = False  # True if kluster started the client, we only restart clients that we own
         self.address = address
         self.show_progress = show_progress
         self.soundspeedprofiles = None
@@ -1120,12 +1121,9 @@ class Fqpr(ZarrBackend):
             if True dump the futures to the multibeam datastore
         """
         if subset_time is not None and dump_data:
-            if isinstance(subset_time[0], list):
-                first_subset_time = subset_time[0][0]
-                last_subset_time = subset_time[-1][-1]
-            else:
-                first_subset_time = subset_time[0]
-                last_subset_time = subset_time[-1]
+            subset_time = normalize_subset_time(subset_time)
+            first_subset_time = subset_time[0][0]
+            last_subset_time = subset_time[-1][-1]
             for ra in self.multibeam.raw_ping:
                 sysid = ra.system_identifier
                 # check to see if this sector is within the subset time
@@ -1942,6 +1940,105 @@ class Fqpr(ZarrBackend):
         endtime = perf_counter()
         self.logger.info('****Calculating total uncertainty complete: {}s****\n'.format(round(endtime - starttime, 1)))
 
+    def pipeline(self, subset_time: list = None, georeference: bool = True, gather: bool = True):
+        """
+        Run the processing chain entirely in memory (get_orientation_vectors, get_beam_pointing_vectors, sv_correct and
+        optionally georef_xyz) without writing to disk.  The intermediate data for each step is released as soon as the
+        next step has been built from it, so that only the last two steps are ever held at once.
+
+        If georeference is True, you must run construct_crs and set_vertical_reference first.
+
+        Parameters
+        ----------
+        subset_time
+            List of unix timestamps in seconds, used as ranges for times that you want to process.
+        georeference
+            if True, will georeference the soundings, else will stop at the vessel coordinate system aligned sv
+            corrected offsets (forward, starboard, down)
+        gather
+            if True, return the valid soundings from the last step, see gather_intermediate_soundings
+
+        Returns
+        -------
+        np.ndarray
+            structured numpy array of the valid soundings (fields x, y, z, tstmp) if gather is True, else None
+        """
+
+        subset_time = normalize_subset_time(subset_time)  # normalize once for all the steps
+        self.get_orientation_vectors(subset_time=subset_time, dump_data=False)
+        self.get_beam_pointing_vectors(subset_time=subset_time, dump_data=False)
+        self._release_intermediate_data('orientation')
+        self.sv_correct(subset_time=subset_time, dump_data=False)
+        self._release_intermediate_data('bpv')
+        if georeference:
+            self.georef_xyz(subset_time=subset_time, dump_data=False)
+            self._release_intermediate_data('sv_corr')
+            data_store = 'georef'
+        else:
+            data_store = 'sv_corr'
+        if gather:
+            return self.gather_intermediate_soundings(data_store)
+        return None
+
+    def _release_intermediate_data(self, mode: str):
+        """
+        Remove the intermediate data for the given process key from all systems, used to drop data that is no longer
+        needed in the in memory workflow
+
+        Parameters
+        ----------
+        mode
+            process key, one of 'orientation', 'bpv', etc.
+        """
+
+        if self.intermediate_dat is not None:
+            for sys_ident in self.intermediate_dat:
+                self.intermediate_dat[sys_ident].pop(mode, None)
+
+    def gather_intermediate_soundings(self, data_store: str = 'georef'):
+        """
+        Pull the valid (non NaN) soundings out of the intermediate data for the given process key, across all systems
+        and installation parameter records.
+
+        Parameters
+        ----------
+        data_store
+            process key for the soundings, 'georef' for the georeferenced soundings or 'sv_corr' for the sv corrected
+            offsets
+
+        Returns
+        -------
+        np.ndarray
+            structured numpy array (see kluster_variables.sounding_dtype) with fields x, y, z and tstmp (xyzrph
+            timestamp for each sounding, as float)
+        """
+
+        # write each chunk into a growable output buffer as we go, so only one gathered chunk is held at a time
+        soundings = None
+        for sector in self.intermediate_dat:
+            if data_store in self.intermediate_dat[sector]:
+                for tstmp in self.intermediate_dat[sector][data_store]:
+                    dat = self.intermediate_dat[sector][data_store][tstmp]
+                    for d in dat:
+                        chunk = d[0] if self.client is None else self.client.gather(d[0])
+                        vals = [np.asarray(chunk[cnt_idx]) for cnt_idx in range(3)]
+                        vals = [v if v.ndim == 1 else v.ravel() for v in vals]
+                        if soundings is None:
+                            # seed the capacity from the first chunk, assuming about half the beams are valid
+                            soundings = _GrowableArray(vals[0].size * len(dat) // 2, dtype=kluster_variables.sounding_dtype)
+                        valid = ~np.isnan(vals[0])
+                        newrecords = soundings.extend(int(valid.sum()))
+                        newrecords['x'] = vals[0][valid]
+                        newrecords['y'] = vals[1][valid]
+                        newrecords['z'] = vals[2][valid]
+                        newrecords['tstmp'] = float(tstmp)
+            else:
+                print('No soundings found for {}'.format(sector))
+
+        if soundings is None:
+            return np.empty(0, dtype=kluster_variables.sounding_dtype)
+        return soundings.values
+
     def export_pings_to_file(self, output_directory: str = None, file_format: str = 'csv', csv_delimiter=' ',
                              filter_by_detection: bool = True, z_pos_down: bool = True, export_by_identifiers: bool = True):
         """
@@ -2210,15 +2307,15 @@ class Fqpr(ZarrBackend):
         data = []
         xyz = [[], [], [], []]
         for rp in self.multibeam.raw_ping:
-            x_idx, x_stck = stack_nan_array(rp['x'], stack_dims=('time', 'beam'))
-            y_idx, y_stck = stack_nan_array(rp['y'], stack_dims=('time', 'beam'))
-            z_idx, z_stck = stack_nan_array(rp['z'], stack_dims=('time', 'beam'))
+            x_idx, x_stck = stack_nan_array_flat(rp['x'], stack_dims=('time', 'beam'))
+            y_idx, y_stck = stack_nan_array_flat(rp['y'], stack_dims=('time', 'beam'))
+            z_idx, z_stck = stack_nan_array_flat(rp['z'], stack_dims=('time', 'beam'))
 
             xyz[0].append(x_stck)
             xyz[1].append(y_stck)
             xyz[2].append(z_stck)
             if 'tvu' in rp and include_unc:
-                unc_idx, unc_stck = stack_nan_array(rp['tvu'], stack_dims=('time', 'beam'))
+                unc_idx, unc_stck = stack_nan_array_flat(rp['tvu'], stack_dims=('time', 'beam'))
                 xyz[3].append(unc_stck)
 
         if xyz[0]:
@@ -3014,6 +3111,43 @@ class Fqpr(ZarrBackend):
         return args, kwargs
 
 
+class _GrowableArray:
+    """
+    1d numpy buffer (optionally a structured dtype) that doubles in capacity when full.  Used to collect an unknown
+    number of values from many chunks without keeping a list of the chunks and concatenating at the end.
+    """
+
+    def __init__(self, capacity: int = 1024, dtype: np.dtype = np.float64):
+        self.buffer = np.empty(max(int(capacity), 1), dtype=dtype)
+        self.size = 0
+
+    def extend(self, count: int):
+        """
+        Grow the filled portion of the buffer by count (doubling the capacity as needed) and return a view of the new
+        records for the caller to fill in
+        """
+
+        needed = self.size + count
+        if needed > self.buffer.shape[0]:
+            newcapacity = self.buffer.shape[0]
+            while newcapacity < needed:
+                newcapacity *= 2
+            newbuffer = np.empty(newcapacity, dtype=self.buffer.dtype)
+            newbuffer[:self.size] = self.buffer[:self.size]
+            self.buffer = newbuffer
+        newrecords = self.buffer[self.size:needed]
+        self.size = needed
+        return newrecords
+
+    @property
+    def values(self):
+        """
+        Return the filled portion of the buffer
+        """
+
+        return self.buffer[:self.size]
+
+
 def get_ping_times(pingrec_time: xr.DataArray, idx: xr.DataArray):
     """
     Given a rangeangle Dataset and an index of values that we are interested in from the Dataset, return the ping
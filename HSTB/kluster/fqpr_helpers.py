@@ -1,46 +1,222 @@
 import os
+import re
+import stat
+from functools import lru_cache
 from typing import Union
 from pyproj import CRS
 from pyproj.exceptions import CRSError
 from HSTB.kluster import kluster_variables
 
 
-def build_crs(zone_num: str = None, datum: str = None, epsg: str = None, projected: bool = True):
-    horizontal_crs = None
+# epsg code: CRS, filled on first use of each code.  Kluster only ever builds a small set of codes (the geographic
+#   NAD83(2011)/WGS84 and the UTM zones from epsg_determinator), so this does not need to be bounded
+_crs_cache = {}
+
+
+def _crs_from_epsg(code: int):
+    """
+    Cached CRS.from_epsg, building the CRS means a trip through the PROJ database, only do it once per epsg code
+
+    Parameters
+    ----------
+    code
+        epsg code
+
+    Returns
+    -------
+    CRS
+        pyproj CRS for the epsg code
+    """
+
+    horizontal_crs = _crs_cache.get(code)
+    if horizontal_crs is None:
+        horizontal_crs = CRS.from_epsg(code)
+        _crs_cache[code] = horizontal_crs
+    return horizontal_crs
+
+
+@lru_cache(maxsize=256)
+def _crs_from_string(crs_string: str):
+    """
+    Cached CRS.from_string, see _crs_from_epsg
+
+    Parameters
+    ----------
+    crs_string
+        proj string or other string pyproj can build a CRS from
+
+    Returns
+    -------
+    CRS
+        pyproj CRS for the string
+    """
+
+    return CRS.from_string(crs_string)
+
+
+# utm zone: epsg code lookups for epsg_determinator.  NAD83(2011) utm is only defined in the northern hemisphere, zones
+#   1-19 and 59-60
+_nad83_north_epsg = {zone: 6329 + zone for zone in range(1, 20)}
+_nad83_north_epsg[59] = 6328
+_nad83_north_epsg[60] = 6329
+# hemisphere identifier: is northern hemisphere
+_hemisphere_is_north = {'n': True, 'N': True, 's': False, 'S': False}
+# datum identifiers accepted by epsg_determinator
+_valid_datums = frozenset(('nad83(2011)', 'wgs84'))
+# lowercase build_crs datum identifier: geographic CRS, filled on first use
+_geographic_crs = {'nad83': None, 'wgs84': None}
+# lowercase build_crs datum identifier: epsg_determinator datum identifier
+_datum_epsg_keys = {'nad83': 'nad83(2011)', 'wgs84': 'wgs84'}
+# zone and hemisphere concatenated, ex: '10N'
+_zone_regex = re.compile(r'(\d{1,2})([NnSs])')
+
+
+def build_crs_epsg(zone_num: str = None, datum: str = None, epsg: str = None, projected: bool = True):
+    """
+    Determine the epsg code for the given options without building the pyproj CRS, see build_crs.  Use this when you
+    only need the epsg code, as building the CRS requires a trip through the PROJ database.
+
+    Parameters
+    ----------
+    zone_num
+        utm zone and hemisphere concatenated, ex: '10N', only used if projected
+    datum
+        datum identifier, one of 'NAD83', 'WGS84'
+    epsg
+        optional, epsg code.  If provided, this is returned as an integer
+    projected
+        if True returns the utm projected epsg code, else the geographic epsg code
+
+    Returns
+    -------
+    int
+        epsg code, None if epsg is provided and is not an epsg code (i.e. a proj string) or if there is an error
+    str
+        error message, empty string if no error
+    """
+
     if epsg:
         try:
-            horizontal_crs = CRS.from_epsg(int(epsg))
-        except CRSError:  # if the CRS we generate here has no epsg, when we save it to disk we save the proj string
-            horizontal_crs = CRS.from_string(epsg)
-    elif not epsg and not projected:
-        datum = datum.upper()
-        if datum == 'NAD83':
-            horizontal_crs = CRS.from_epsg(epsg_determinator('nad83(2011)'))
-        elif datum == 'WGS84':
-            horizontal_crs = CRS.from_epsg(epsg_determinator('wgs84'))
-        else:
-            err = '{} not supported.  Only supports WGS84 and NAD83'.format(datum)
-            return horizontal_crs, err
-    elif not epsg and projected:
-        datum = datum.upper()
+            return int(epsg), ''
+        except ValueError:  # not an integer epsg code, ex: a proj string
+            return None, ''
+    return _build_crs_epsg_lc(zone_num, datum.lower(), projected)
+
+
+def _build_crs_epsg_lc(zone_num: str, datum_lc: str, projected: bool):
+    """
+    build_crs_epsg without the epsg option, for an already lowercase datum identifier, so that build_crs only has to
+    case fold the datum once
+
+    Parameters
+    ----------
+    zone_num
+        utm zone and hemisphere concatenated, ex: '10N', only used if projected
+    datum_lc
+        lowercase datum identifier, one of 'nad83', 'wgs84'
+    projected
+        if True returns the utm projected epsg code, else the geographic epsg code
+
+    Returns
+    -------
+    int
+        epsg code, None if there is an error
+    str
+        error message, empty string if no error
+    """
+
+    zone, hemi = None, None
+    if projected:
         zone = zone_num  # this will be the zone and hemi concatenated, '10N'
-        try:
-            zone, hemi = int(zone[:-1]), str(zone[-1:])
-        except:
+        zone_match = _zone_regex.fullmatch(zone) if isinstance(zone, str) else None
+        if zone_match is None:
             raise ValueError(
-                'construct_crs: found invalid projected zone/hemisphere identifier: {}, expected something like "10N"'.format(
-                    zone))
-
-        if datum == 'NAD83':
-            horizontal_crs = CRS.from_epsg(epsg_determinator('nad83(2011)', zone=zone, hemisphere=hemi))
-        elif datum == 'WGS84':
-            horizontal_crs = CRS.from_epsg(epsg_determinator('wgs84', zone=zone, hemisphere=hemi))
-        else:
-            err = '{} not supported.  Only supports WGS84 and NAD83'.format(datum)
-            return horizontal_crs, err
+                f'construct_crs: found invalid projected zone/hemisphere identifier: {zone}, expected something like "10N"')
+        zone, hemi = int(zone_match.group(1)), zone_match.group(2)
+
+    datum = _datum_epsg_keys.get(datum_lc)
+    if datum is None:
+        err = f'{datum_lc.upper()} not supported.  Only supports WGS84 and NAD83'
+        return None, err
+    return _epsg_determinator_lc(datum, zone, hemi), ''
+
+
+def build_crs(zone_num: str = None, datum: str = None, epsg: str = None, projected: bool = True):
+    if epsg:
+        try:
+            return _crs_from_epsg(int(epsg)), ''
+        except (ValueError, CRSError):  # if the CRS we generate here has no epsg, when we save it to disk we save the proj string
+            return _crs_from_string(epsg), ''
+
+    datum_lc = datum.lower()
+    if not projected:  # only two possible geographic CRS, skip the epsg determination after the first time
+        horizontal_crs = _geographic_crs.get(datum_lc)
+        if horizontal_crs is not None:
+            return horizontal_crs, ''
+
+    code, err = _build_crs_epsg_lc(zone_num, datum_lc, projected)
+    if err:
+        return None, err
+    horizontal_crs = _crs_from_epsg(code)
+    if not projected:
+        _geographic_crs[datum_lc] = horizontal_crs
     return horizontal_crs, ''
 
 
+def build_crs_batch(specs: list):
+    """
+    Build the CRS for many sets of build_crs options at once, for when you are building a CRS per multibeam line in a
+    large batch of lines.  Lines that share the same options (the usual case, a survey is generally all one zone)
+    only build the CRS once.
+
+    Parameters
+    ----------
+    specs
+        list of dicts, each dict being the keyword arguments to build_crs, ex: {'zone_num': '10N', 'datum': 'NAD83'}
+
+    Returns
+    -------
+    list
+        list of (CRS, error message) tuples, one for each spec in specs, see build_crs
+    """
+
+    built = {}
+    out = []
+    for spec in specs:
+        key = (spec.get('zone_num'), spec.get('datum'), spec.get('epsg'), spec.get('projected', True))
+        if key not in built:
+            built[key] = build_crs(**spec)
+        out.append(built[key])
+    return out
+
+
+def _epsg_utm(datum: str, zone: int, is_north: bool):
+    """
+    Return the utm epsg code for the given lowercase datum identifier, see epsg_determinator
+
+    Parameters
+    ----------
+    datum
+        lowercase datum identifier string, one of nad83(2011), wgs84
+    zone
+        integer utm zone number
+    is_north
+        True if northern hemisphere
+
+    Returns
+    -------
+    int
+        epsg code, None if there is no utm epsg code for this datum/zone/hemisphere
+    """
+
+    if datum == 'wgs84':
+        if 1 <= zone <= 60:
+            return (32600 if is_north else 32700) + zone
+    elif is_north:  # nad83(2011) utm is only defined in the northern hemisphere
+        return _nad83_north_epsg.get(zone)
+    return None
+
+
 def epsg_determinator(datum: str, zone: int = None, hemisphere: str = None):
     """
     Take in a datum identifer and optional zone/hemi for projected and return an epsg code
@@ -60,42 +236,110 @@ def epsg_determinator(datum: str, zone: int = None, hemisphere: str = None):
         epsg code
     """
 
-    try:
-        datum = datum.lower()
-    except:
-        raise ValueError('epsg_determinator: {} is not a valid datum string, expected "nad83(2011)" or "wgs84"')
+    if not isinstance(datum, str):
+        raise ValueError(f'epsg_determinator: {datum} is not a valid datum string, expected "nad83(2011)" or "wgs84"')
+    datum = datum.lower()
 
     if zone is None and hemisphere is not None:
         raise ValueError('epsg_determinator: zone is required for projected epsg determination')
     if zone is not None and hemisphere is None:
         raise ValueError('epsg_determinator: hemisphere is required for projected epsg determination')
-    if datum not in ['nad83(2011)', 'wgs84']:
-        raise ValueError('epsg_determinator: {} not supported'.format(datum))
-
-    if zone is None and hemisphere is None:
-        if datum == 'nad83(2011)':  # using the 3d geodetic NAD83(2011)
-            return kluster_variables.epsg_nad83
-        elif datum == 'wgs84':  # using the 3d geodetic WGS84/ITRF2008
-            return kluster_variables.epsg_wgs84
-    else:
-        hemisphere = hemisphere.lower()
-        if datum == 'nad83(2011)':
-            if hemisphere == 'n':
-                if zone <= 19:
-                    return 6329 + zone
-                elif zone == 59:
-                    return 6328
-                elif zone == 60:
-                    return 6329
-        elif datum == 'wgs84':
-            if hemisphere == 's':
-                return 32700 + zone
-            elif hemisphere == 'n':
-                return 32600 + zone
-    raise ValueError('epsg_determinator: no valid epsg for datum={} zone={} hemisphere={}'.format(datum, zone, hemisphere))
-
-
-def return_files_from_path(pth: str, file_ext: tuple = ('.all',)):
+    if datum not in _valid_datums:
+        raise ValueError(f'epsg_determinator: {datum} not supported')
+    return _epsg_determinator_lc(datum, zone, hemisphere)
+
+
+def _epsg_determinator_lc(datum: str, zone: int = None, hemisphere: str = None):
+    """
+    epsg_determinator without the input validation, datum must already be a lowercase supported datum identifier and
+    zone/hemisphere must be both provided or both None
+
+    Parameters
+    ----------
+    datum
+        lowercase datum identifier string, one of nad83(2011), wgs84
+    zone
+        integer utm zone number
+    hemisphere
+        hemisphere identifier, "n" for north, "s" for south
+
+    Returns
+    -------
+    int
+        epsg code
+    """
+
+    if zone is not None:  # projected, the utm zone case is the common one when building a CRS per file
+        is_north = _hemisphere_is_north.get(hemisphere)
+        code = _epsg_utm(datum, zone, is_north) if is_north is not None else None
+        if code is not None:
+            return code
+    elif datum == 'nad83(2011)':  # using the 3d geodetic NAD83(2011)
+        return kluster_variables.epsg_nad83
+    else:  # using the 3d geodetic WGS84/ITRF2008
+        return kluster_variables.epsg_wgs84
+    raise ValueError(f'epsg_determinator: no valid epsg for datum={datum} zone={zone} hemisphere={hemisphere}')
+
+
+def _iter_candidates(pth: Union[list, str]):
+    """
+    Generator for all the file paths that return_files_from_path should check the extension of.  A list one element
+    long that is a path to a directory is treated the same as the directory path.
+
+    Parameters
+    ----------
+    pth
+        either a list of files, a string path to a directory or a string path to a file
+
+    Returns
+    -------
+    generator
+        yields each candidate file path
+    """
+
+    candidate = pth
+    if type(pth) == list:
+        if len(pth) != 1:
+            yield from pth
+            return
+        candidate = pth[0]  # a list one element long could be a path to a directory
+
+    # one stat call to tell directory from file (or nothing at all), instead of isdir and then isfile
+    try:
+        st_mode = os.stat(candidate).st_mode
+    except (OSError, ValueError):
+        st_mode = 0
+    if stat.S_ISDIR(st_mode):
+        with os.scandir(candidate) as entries:
+            for entry in entries:
+                yield entry.path
+    elif type(pth) == list:  # list of files are passed through as is
+        yield from pth
+    elif stat.S_ISREG(st_mode):
+        yield pth
+
+
+@lru_cache(maxsize=32)
+def _extension_tuple(file_ext: Union[frozenset, tuple]):
+    """
+    Lowercase the given file extensions for a case insensitive str.endswith match in return_files_from_path.  Cached,
+    as return_files_from_path is called with the same few extensions over and over.
+
+    Parameters
+    ----------
+    file_ext
+        file extension(s), ex: frozenset({'.all', '.kmall'})
+
+    Returns
+    -------
+    tuple
+        unique lowercase file extensions
+    """
+
+    return tuple(frozenset(e.lower() for e in file_ext))
+
+
+def return_files_from_path(pth: str, file_ext: frozenset = frozenset({'.all'})):
     """
     Input files can be entered into an xarray_conversion.BatchRead instance as either a list, a path to a directory
     of multibeam files or as a path to a single file.  Here we return all the files in each of these scenarios as a list
@@ -108,7 +352,9 @@ def return_files_from_path(pth: str, file_ext: tuple = ('.all',)):
     pth
         either a list of files, a string path to a directory or a string path to a file
     file_ext
-        file extension of the file(s) you are looking for
+        file extension(s) of the file(s) you are looking for, matched case insensitive, either a single extension
+        string (ex: '.all') or a collection of them.  Pass a string, frozenset or tuple, the lowercased extensions are
+        cached per unique file_ext, a list is converted on each call
 
     Returns
     -------
@@ -116,20 +362,12 @@ def return_files_from_path(pth: str, file_ext: tuple = ('.all',)):
         list of files found
     """
 
-    if type(pth) == list:
-        if len(pth) == 1 and os.path.isdir(pth[0]):  # a list one element long that is a path to a directory
-            return [os.path.join(pth[0], p) for p in os.listdir(pth[0]) if os.path.splitext(p)[1] in file_ext]
-        else:
-            return [p for p in pth if os.path.splitext(p)[1] in file_ext]
-    elif os.path.isdir(pth):
-        return [os.path.join(pth, p) for p in os.listdir(pth) if os.path.splitext(p)[1] in file_ext]
-    elif os.path.isfile(pth):
-        if os.path.splitext(pth)[1] in file_ext:
-            return [pth]
-        else:
-            return []
-    else:
-        return []
+    if isinstance(file_ext, str):  # a single extension, tuple(file_ext) would split it into characters
+        file_ext = (file_ext,)
+    elif not isinstance(file_ext, (frozenset, tuple)):
+        file_ext = tuple(file_ext)
+    ext_tuple = _extension_tuple(file_ext)
+    return [p for p in _iter_candidates(pth) if p.lower().endswith(ext_tuple)]
 
 
 def return_directory_from_data(data: Union[list, str]):
@@ -148,8 +386,8 @@ def return_directory_from_data(data: Union[list, str]):
     output_directory: str, path to output directory
     """
 
-    try:  # they provided a path to a zarr store or a path to a directory of .all files or a single .all file
-        output_directory = os.path.dirname(data)
-    except TypeError:  # they provided a list of files
-        output_directory = os.path.dirname(data[0])
+    if isinstance(data, (list, tuple)):  # they provided a list of files
+        data = data[0]
+    # otherwise a path to a zarr store or a path to a directory of .all files or a single .all file
+    output_directory = os.path.dirname(os.fspath(data))
     return output_directory
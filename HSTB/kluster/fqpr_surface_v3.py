@@ -113,12 +113,22 @@ class QuadManager:
         basic operations.  Also, you can't do any fancy indexing with xarray Dataset, at best you can use slice with isel.
 
         For all these reasons, we just convert to numpy.
+
+        If the Dataset is dask backed, each variable is loaded straight into the structured array one chunk at a time,
+        so we never hold more than one loaded chunk in memory on top of the structured array.
         """
         allowed_vars = ['x', 'y', 'z', 'tvu', 'thu']
         dtyp = [(varname, self.data[varname].dtype) for varname in allowed_vars if varname in self.data]
-        empty_struct = np.empty(len(self.data['x']), dtype=dtyp)
+        empty_struct = np.empty(self.data['x'].shape[0], dtype=dtyp)
         for varname, vartype in dtyp:
-            empty_struct[varname] = self.data[varname].values
+            vardata = self.data[varname].data
+            if isinstance(vardata, da.Array):
+                chunk_ends = np.cumsum(vardata.chunks[0])
+                chunk_starts = chunk_ends - np.array(vardata.chunks[0])
+                for strt, end in zip(chunk_starts, chunk_ends):
+                    empty_struct[varname][strt:end] = vardata[strt:end].compute()
+            else:
+                empty_struct[varname] = vardata
         self.data = empty_struct
 
     def _build_node_data_matrix(self, mins: list, maxs: list):
@@ -292,8 +302,8 @@ class QuadManager:
         self.min_grid_size = min_grid_size
         self.max_grid_size = max_grid_size
 
-        if isinstance(data, (da.Array, xr.Dataset)):
-            data = data.compute()
+        if isinstance(data, da.Array):
+            data = data.compute()  # xarray Datasets are loaded variable by variable in _convert_dataset
         self.data = data
         self._validate_input_data()
         self._update_metadata(container_name, multibeam_file_list, crs, vertical_reference)
@@ -11,6 +11,7 @@ max_beams = 400  # starting max beams in kluster (can grow beyond)
 epsg_nad83 = 6319
 epsg_wgs84 = 7911
 default_number_of_chunks = 4
+auto_skip_dask_size = 256  # total multibeam file size (MB) below which perform_all_processing will skip starting dask
 
 supported_multibeam = ['.all', '.kmall']
 multibeam_uses_quality_factor = ['.all']
@@ -24,6 +25,17 @@ vdatum_vertical_references = ['NOAA MLLW', 'NOAA MHW']  # vertical reference opt
 ellipse_based_vertical_references = ['ellipse', 'NOAA MLLW', 'NOAA MHW']  # vertical reference options based on the ellipsoid
 waterline_based_vertical_references = ['waterline']  # vertical reference options based on waterline
 coordinate_systems = ['NAD83', 'WGS84']  # horizontal coordinate system options
+# translate the sonar mode identifiers stored in the ping records to readable mode names
+mode_translator = {'vsCW': 'CW_veryshort', 'shCW': 'CW_short', 'meCW': 'CW_medium', 'loCW': 'CW_long',
+                   'vlCW': 'CW_verylong', 'elCW': 'CW_extralong', 'shFM': 'FM_short', 'loFM': 'FM_long',
+                   '__FM': 'FM', 'FM': 'FM', 'CW': 'CW', 'VS': 'VeryShallow', 'SH': 'Shallow', 'ME': 'Medium',
+                   'DE': 'Deep', 'VD': 'VeryDeep', 'ED': 'ExtraDeep'}
+
+# surface generation
+surface_variables = ['x', 'y', 'z', 'tvu', 'thu']  # sounding variables pulled from the ping records to build a surface
+
+# in memory soundings
+sounding_dtype = [('x', 'f8'), ('y', 'f8'), ('z', 'f8'), ('tstmp', 'f8')]  # record layout of the gathered soundings, see Fqpr.pipeline
 
 # xarray conversion
 ping_chunk_size = 1000  # chunk size (in pings) of each written chunk of data in the ping records
@@ -1,6 +1,8 @@
 import os
+import threading
 import xarray as xr
 import numpy as np
+from functools import lru_cache
 from pyproj import Transformer, CRS
 from typing import Union
 
@@ -136,7 +138,7 @@ def georef_by_worker(sv_corr: list, alt: xr.DataArray, lon: xr.DataArray, lat: x
         # - lon, lat - this appears to be valid when using CRS from proj4 string
         # - lat, lon - this appears to be valid when using CRS from epsg
         # use the always_xy option to force the transform to expect lon/lat order
-        georef_transformer = Transformer.from_crs(input_crs, horizontal_crs, always_xy=True)
+        georef_transformer = _transformer_from_wkt(input_crs.to_wkt(), horizontal_crs.to_wkt(), threading.get_ident())
         newpos = georef_transformer.transform(pos[0], pos[1], errcheck=True)  # longitude / latitude order (x/y)
     else:
         newpos = pos
@@ -147,6 +149,32 @@ def georef_by_worker(sv_corr: list, alt: xr.DataArray, lon: xr.DataArray, lat: x
     return [x, y, z, corr_heave, corr_altitude, vdatum_unc]
 
 
+@lru_cache(maxsize=64)
+def _transformer_from_wkt(input_wkt: str, output_wkt: str, thread_id: int):
+    """
+    Build the pyproj Transformer from the input crs to the output crs, cached on the wkt of each crs so that
+    georeferencing many chunks with the same crs pair only pays the transformer construction cost once.  pyproj CRS and
+    Transformer objects are not thread safe before pyproj 3.1, so the cache is also keyed on the thread, each dask
+    worker thread gets its own Transformer.
+
+    Parameters
+    ----------
+    input_wkt
+        wkt string for the input crs
+    output_wkt
+        wkt string for the output crs
+    thread_id
+        threading.get_ident() of the calling thread, only used as part of the cache key
+
+    Returns
+    -------
+    Transformer
+        pyproj Transformer that expects longitude/latitude (x/y) order
+    """
+
+    return Transformer.from_crs(CRS.from_wkt(input_wkt), CRS.from_wkt(output_wkt), always_xy=True)
+
+
 def transform_vyperdatum(x: xr.DataArray, y: xr.DataArray, z: xr.DataArray, source_datum: Union[str, int] = 'nad83',
                          final_datum: str = 'mllw', vdatum_directory: str = None):
     """
@@ -3,7 +3,7 @@ import numpy as np
 
 from HSTB.kluster.rotations import return_mounting_rotation_matrix, combine_rotation_matrix, \
     return_attitude_rotation_matrix
-from HSTB.kluster.xarray_helpers import interp_across_chunks, reform_nan_array, stack_nan_array
+from HSTB.kluster.xarray_helpers import interp_across_chunks, reform_nan_array, stack_nan_array_flat
 
 
 def distrib_run_build_orientation_vectors(dat: list):
@@ -138,7 +138,7 @@ def get_times(pingtime: xr.DataArray, additional: xr.DataArray):
 
     """
     rx_tstmp = pingtime + additional
-    rx_tstmp_idx, rx_tstmp_stck = stack_nan_array(rx_tstmp, stack_dims=('time', 'beam'))
-    unique_rx_times, inv_idx = np.unique(rx_tstmp_stck.values, return_inverse=True)
+    rx_tstmp_idx, rx_tstmp_stck = stack_nan_array_flat(rx_tstmp, stack_dims=('time', 'beam'))
+    unique_rx_times, inv_idx = np.unique(rx_tstmp_stck, return_inverse=True)
     rx_interptimes = xr.DataArray(unique_rx_times, coords=[unique_rx_times], dims=['time']).chunk()
     return rx_tstmp_idx, inv_idx, rx_interptimes
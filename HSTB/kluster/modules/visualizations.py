@@ -14,7 +14,7 @@ import matplotlib.widgets
 
 from mpl_toolkits.mplot3d import Axes3D  # need this, is used in backend for 3d plots
 
-from HSTB.kluster.xarray_helpers import stack_nan_array
+from HSTB.kluster.xarray_helpers import stack_nan_array_flat
 
 
 class Player(FuncAnimation):
@@ -371,15 +371,15 @@ class FqprVisualizations:
         ax = fig.add_subplot(111, projection='3d')
 
         for rp in self.fqpr.multibeam.raw_ping:
-            x_idx, x_stck = stack_nan_array(rp[xvar], stack_dims=('time', 'beam'))
-            y_idx, y_stck = stack_nan_array(rp[yvar], stack_dims=('time', 'beam'))
-            z_idx, z_stck = stack_nan_array(rp[zvar], stack_dims=('time', 'beam'))
+            x_idx, x_stck = stack_nan_array_flat(rp[xvar], stack_dims=('time', 'beam'))
+            y_idx, y_stck = stack_nan_array_flat(rp[yvar], stack_dims=('time', 'beam'))
+            z_idx, z_stck = stack_nan_array_flat(rp[zvar], stack_dims=('time', 'beam'))
 
             if color_by == 'depth':
-                ax.scatter(x_stck.values, y_stck.values, z_stck.values, marker='o', s=10, c=z_stck.values)
+                ax.scatter(x_stck, y_stck, z_stck, marker='o', s=10, c=z_stck)
             elif color_by == 'sector':
                 sector_vals = rp.txsector_beam.values[x_idx]
-                ax.scatter(x_stck.values, y_stck.values, z_stck.values, marker='o', s=10, c=sector_vals)
+                ax.scatter(x_stck, y_stck, z_stck, marker='o', s=10, c=sector_vals)
 
         ax.set_xlim(minx, maxx)
         ax.set_ylim(miny, maxy)
@@ -430,9 +430,9 @@ class FqprVisualizations:
         fig = plt.figure()
 
         for rp in self.fqpr.multibeam.raw_ping:
-            x_idx, x_stck = stack_nan_array(rp[xvar], stack_dims=('time', 'beam'))
-            y_idx, y_stck = stack_nan_array(rp[yvar], stack_dims=('time', 'beam'))
-            z_idx, z_stck = stack_nan_array(rp[zvar], stack_dims=('time', 'beam'))
+            x_idx, x_stck = stack_nan_array_flat(rp[xvar], stack_dims=('time', 'beam'))
+            y_idx, y_stck = stack_nan_array_flat(rp[yvar], stack_dims=('time', 'beam'))
+            z_idx, z_stck = stack_nan_array_flat(rp[zvar], stack_dims=('time', 'beam'))
 
             if color_by == 'depth':
                 plt.scatter(y_stck, x_stck, marker='+', c=z_stck, cmap='coolwarm', s=5)
@@ -98,6 +98,76 @@ def hist2d_numba_seq(x: np.array, y: np.array, bins: np.ndarray, ranges: np.ndar
     return hist
 
 
+@numba.njit(nogil=True, cache=True)
+def dual_head_match(my_y_mean: float, kongs_y_mean: np.array, idx: int, prev_index: int):
+    """
+    Find the par xyz88 record that is on the same side (port/stbd) as the kluster ping, checking the record at idx
+    first and then the surrounding records, starting with the offset that worked for the last mismatched ping.  See
+    fqpr_convenience._dual_head_sort.
+
+    Parameters
+    ----------
+    my_y_mean
+        float, mean acrosstrack value for the kluster ping
+    kongs_y_mean
+        numpy array, mean acrosstrack value for each ping from par xyz88 read
+    idx
+        int, index for the par/kluster records
+    prev_index
+        int, offset found for the last mismatched ping
+
+    Returns
+    -------
+    bool
+        True if a matching record was found
+    int
+        index of the matching par record
+    int
+        offset to use as prev_index for the next run
+    """
+
+    my_port = my_y_mean < 0
+    if (kongs_y_mean[idx] < 0) == my_port:
+        return True, idx, prev_index
+    potential_idxs = (-prev_index, 1, -1, 2, -2)
+    for pot_idx in potential_idxs:
+        ki = idx + pot_idx
+        if ki >= kongs_y_mean.shape[0]:
+            continue
+        if (kongs_y_mean[ki] < 0) == my_port:
+            return True, ki, pot_idx
+    return False, idx, prev_index
+
+
+@numba.njit(nogil=True, cache=True)
+def unwrap_degrees(src: np.array, dst: np.array):
+    """
+    np.unwrap for an array of angles in degrees, in a single pass and without the deg2rad/rad2deg round trip.  Jumps
+    between consecutive angles of 180 degrees or more are corrected by multiples of 360.  The running correction is
+    kept in float64 and the result is written to dst, which can be a different dtype (float32 for heading).
+
+    Parameters
+    ----------
+    src
+        numpy array, angles in degrees
+    dst
+        numpy array, same length as src, populated with the unwrapped angles
+    """
+
+    if src.shape[0] == 0:
+        return
+    correction = 0.0
+    dst[0] = src[0]
+    for i in range(1, src.shape[0]):
+        dd = np.float64(src[i]) - np.float64(src[i - 1])
+        if abs(dd) >= 180.0:
+            ddmod = (dd + 180.0) % 360.0 - 180.0
+            if ddmod == -180.0 and dd > 0:
+                ddmod = 180.0
+            correction += ddmod - dd
+        dst[i] = src[i] + correction
+
+
 def _hist2d_add(list_results: list):
     """
     Quick helper function that we can submit to dask cluster to sum the results of running hist2d_numba_seq on multiple
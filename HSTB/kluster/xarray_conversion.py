@@ -721,6 +721,31 @@ def _closest_key_value(tstmps: list, key: float):
     return closest_tim
 
 
+def normalize_subset_time(subset_time: Union[list, np.ndarray, None]):
+    """
+    Processing methods take subset_time as either a single [start, end] range or a list of [start, end] ranges.
+    Normalize to a 2d float64 array of ranges (one row per [start, end]) once, so that every method using it can skip
+    the list checks.  Passing an already normalized array returns it unchanged.
+
+    Parameters
+    ----------
+    subset_time
+        List of unix timestamps in seconds, used as ranges for times that you want to process.\n
+        ex: subset_time=[1531317999, 1531321000] or subset_time=[[1531317999, 1531318885], [1531318886, 1531321000]]
+
+    Returns
+    -------
+    np.ndarray
+        (number of ranges, 2) array of start/end times, or None if subset_time is None
+    """
+
+    if subset_time is None:
+        return None
+    if isinstance(subset_time, np.ndarray) and subset_time.ndim == 2 and subset_time.dtype == np.float64:
+        return subset_time
+    return np.asarray(subset_time, dtype=np.float64).reshape(-1, 2)
+
+
 def batch_read_configure_options():
     """
     Generate the parameters that drive the data conversion.  Chunksize for size of zarr written chunks,
@@ -980,7 +1005,8 @@ class BatchRead(ZarrBackend):
             # self.logger.warning('Unable to reload ping records (normal for in memory processing), no paths found: {}'.format(self.final_paths))
             pass
 
-    def read_from_zarr_fils(self, ping_pth: list, attitude_pth: str, navigation_pth: str, logfile_pth: str):
+    def read_from_zarr_fils(self, ping_pth: list, attitude_pth: str, navigation_pth: str, logfile_pth: str,
+                            consolidated: bool = False):
         """
         Read from the generated zarr datastores constructed with read()
 
@@ -994,6 +1020,8 @@ class BatchRead(ZarrBackend):
             path to the navigation zarr group
         logfile_pth
             path to the text log file used by logging
+        consolidated
+            if True, will use the consolidated metadata of each zarr store (if it exists) when opening
         """
 
         self.raw_ping = None
@@ -1011,7 +1039,7 @@ class BatchRead(ZarrBackend):
         else:
             skip_dask = False
         try:
-            self.raw_ping = [reload_zarr_records(pth, skip_dask, sort_by='time') for pth in ping_pth]
+            self.raw_ping = [reload_zarr_records(pth, skip_dask, sort_by='time', consolidated=consolidated) for pth in ping_pth]
             # interp_these = ['mode', 'modetwo', 'yawpitchstab']
             # for variable in interp_these:
             #     if variable in finalarr:
@@ -1044,7 +1072,7 @@ class BatchRead(ZarrBackend):
         else:
             skip_dask = False
         try:
-            self.raw_att = reload_zarr_records(attitude_pth, skip_dask, sort_by='time')
+            self.raw_att = reload_zarr_records(attitude_pth, skip_dask, sort_by='time', consolidated=consolidated)
             self.raw_att = self.raw_att.isel(time=np.unique(self.raw_att.time, return_index=True)[1])
         except (ValueError, AttributeError):
             self.logger.error('Unable to read from {}'.format(attitude_pth))
@@ -1057,7 +1085,7 @@ class BatchRead(ZarrBackend):
         else:
             skip_dask = False
         try:
-            self.raw_nav = reload_zarr_records(navigation_pth, skip_dask, sort_by='time')
+            self.raw_nav = reload_zarr_records(navigation_pth, skip_dask, sort_by='time', consolidated=consolidated)
             self.raw_nav = self.raw_nav.isel(time=np.unique(self.raw_nav.time, return_index=True)[1])
         except (ValueError, AttributeError):
             self.logger.error('Unable to read from {}'.format(navigation_pth))
@@ -1448,9 +1476,13 @@ class BatchRead(ZarrBackend):
             del newrecfutures
 
             finalpths = {'ping': [], 'attitude': [], 'navigation': []}
+            # submit the divide for all record types up front, so the workers can split out attitude/navigation while
+            #  we are still writing the ping records, instead of waiting on each datatype in turn
+            divided_xarrs = {datatype: self.client.map(_divide_xarray_futs, xarrfutures, [datatype] * len(xarrfutures))
+                             for datatype in finalpths}
+            del xarrfutures
             for datatype in ['ping', 'attitude', 'navigation']:
-                input_xarrs = self.client.map(_divide_xarray_futs, xarrfutures, [datatype] * len(xarrfutures))
-                input_xarrs = self._batch_read_sort_futures_by_time(input_xarrs)
+                input_xarrs = self._batch_read_sort_futures_by_time(divided_xarrs.pop(datatype))
                 finalattrs = self.client.gather(self.client.map(gather_dataset_attributes, input_xarrs))
                 combattrs = combine_xr_attributes(finalattrs)
 
@@ -1956,7 +1988,8 @@ class BatchRead(ZarrBackend):
         Parameters
         ----------
         subset_time
-            List of unix timestamps in seconds, used as ranges for times that you want to process
+            List of unix timestamps in seconds, used as ranges for times that you want to process, or the already
+            normalized array from normalize_subset_time
 
         Returns
         -------
@@ -1965,10 +1998,16 @@ class BatchRead(ZarrBackend):
         """
 
         resulting_systems = []
+        subset_time = normalize_subset_time(subset_time)
         prefixes = self.return_xyz_prefixes_for_systems()
         for cnt, ra in enumerate(self.raw_ping):
             txrx = prefixes[cnt]
             tstmps = self.return_xyzrph_sorted_timestamps(txrx[0] + '_x')
+            if subset_time is not None:  # only include times that fall within the subset ranges, same for all tstmps
+                ping_times = ra.time.values
+                subset_msk = np.zeros(ping_times.shape, dtype=bool)
+                for minimum_time, maximum_time in subset_time:  # build the mask for each subset and add it to the final idx
+                    subset_msk |= (ping_times >= minimum_time) & (ping_times <= maximum_time)
             resulting_tstmps = []
             for tstmp in tstmps:
                 # fudge factor for how the install param record is sometime included up to a couple seconds after the
@@ -1987,15 +2026,8 @@ class BatchRead(ZarrBackend):
                 # timestamps for ping records that are at or past the install param record we are using
                 tx_idx = np.logical_and(ra.time >= float(newtstmp), ra.time <= float(maxtime))
 
-                if subset_time is not None:  # only include times that fall within the subset ranges
-                    final_tx_idx = np.zeros_like(ra.time, dtype=bool)
-                    if type(subset_time[0]) is not list:  # fix for when user provides just a list of floats [start,end]
-                        subset_time = [subset_time]
-                    for minimum_time, maximum_time in subset_time:  # build the mask for each subset and add it to the final idx
-                        start_msk = np.logical_and(ra.time >= float(minimum_time), ra.time <= float(maximum_time))
-                        start_msk = np.logical_and(tx_idx, start_msk)
-                        final_tx_idx = np.logical_or(final_tx_idx, start_msk)
-                    tx_idx = final_tx_idx
+                if subset_time is not None:
+                    tx_idx = np.logical_and(tx_idx, subset_msk)
                 resulting_tstmps.append([tx_idx, tstmp, txrx])
             resulting_systems.append(resulting_tstmps)
         return resulting_systems
@@ -1,14 +1,74 @@
 import os
 import numpy as np
 import json
+from collections import defaultdict
+from functools import lru_cache
 import xarray as xr
 
 import zarr
 
+import dask
+import dask.array as da
+from concurrent.futures import ThreadPoolExecutor
 from dask.distributed import Client
 from xarray.core.combine import _infer_concat_order_from_positions, _nested_combine
 from typing import Union
 
+from HSTB.kluster.numba_helpers import unwrap_degrees
+from HSTB.kluster.backends._zarr import consolidate_metadata, open_zarr_readonly
+
+try:
+    import orjson
+    orjson_found = True
+except ModuleNotFoundError:
+    orjson_found = False
+
+# open_zarr options used to read the kluster zarr stores as written, see reload_zarr_records
+_zarr_decode_options = {'mask_and_scale': False, 'decode_coords': False, 'decode_times': False, 'decode_cf': False,
+                        'concat_characters': False}
+
+
+def _json_loads(val: Union[str, bytes]):
+    """
+    Parse a json attribute string, with orjson if it is installed (much faster), otherwise the json module
+
+    Parameters
+    ----------
+    val
+        json string
+
+    Returns
+    -------
+    Any
+        parsed json
+    """
+
+    if orjson_found:
+        return orjson.loads(val)
+    return json.loads(val)
+
+
+def _json_compare_key(val: dict):
+    """
+    Serialize val to a string only used to compare against other values of this function, with orjson if it is
+    installed.  Attribute values that are written to disk use json.dumps, so that the stored strings are the same
+    format as those already in existing datasets.
+
+    Parameters
+    ----------
+    val
+        json serializable object
+
+    Returns
+    -------
+    Union[str, bytes]
+        serialized val
+    """
+
+    if orjson_found:
+        return orjson.dumps(val)
+    return json.dumps(val)
+
 
 def my_open_mfdataset(paths: list, chnks: dict = None, concat_dim: str = 'time', compat: str = 'no_conflicts',
                       data_vars: str = 'all', coords: str = 'different', join: str = 'outer'):
@@ -49,17 +109,14 @@ def my_open_mfdataset(paths: list, chnks: dict = None, concat_dim: str = 'time',
         attributes, variables, dimensions of combined netCDF files.  Returns dask arrays, compute to access local numpy array.
     """
 
-    # ensure file paths are valid
-    pth_chk = np.all([os.path.exists(x) for x in paths])
-    if not pth_chk:
-        raise ValueError('Check paths supplied to function.  Some/all files do not exist.')
-
-    # sort by filename index, e.g. rangeangle_0.nc, rangeangle_1.nc, rangeangle_2.nc, etc.
-    idxs = [int(os.path.splitext(os.path.split(x)[1])[0].split('_')[1]) for x in paths]
-    sortorder = sorted(range(len(idxs)), key=lambda k: idxs[k])
+    # ensure file paths are valid, checking in threads as each check is a stat call that may be on a network share
+    with ThreadPoolExecutor(max_workers=max(min(32, len(paths)), 1)) as executor:
+        missing = [pth for pth, exists in zip(paths, executor.map(os.path.exists, paths)) if not exists]
+    if missing:
+        raise ValueError('Check paths supplied to function.  Some/all files do not exist: {}'.format(missing[:5]))
 
-    # sort_paths are the paths in sorted order by the filename index
-    sort_paths = [paths[p] for p in sortorder]
+    # sort_paths are the paths in sorted order by the filename index, e.g. rangeangle_0.nc, rangeangle_1.nc, etc.
+    sort_paths = sorted(paths, key=lambda x: int(os.path.splitext(os.path.split(x)[1])[0].split('_')[1]))
 
     # build out the arugments for the nested combine
     if isinstance(concat_dim, (str, xr.DataArray)) or concat_dim is None:
@@ -69,7 +126,10 @@ def my_open_mfdataset(paths: list, chnks: dict = None, concat_dim: str = 'time',
     if chnks is None:
         chnks = {}
 
-    datasets = [xr.open_dataset(p, engine='netcdf4', chunks=chnks, lock=None, autoclose=None) for p in paths]
+    # opening is mostly reading the netcdf headers, open the files in threads (parallel=True does not work, see above).
+    #   lock=None lets xarray use its default netcdf/hdf5 lock, so the library calls stay thread safe
+    with ThreadPoolExecutor(max_workers=max(min(32, len(paths)), 1)) as executor:
+        datasets = list(executor.map(lambda p: xr.open_dataset(p, engine='netcdf4', chunks=chnks, lock=None, autoclose=None), paths))
 
     combined = _nested_combine(datasets, concat_dims=concat_dim, compat=compat, data_vars=data_vars,
                                coords=coords, ids=ids, join=join)
@@ -149,7 +209,8 @@ def xarr_to_zarr(xarr: xr.Dataset, outputpth: str, attrs: dict = None):
 
 def resize_zarr(zarrpth: str, finaltimelength: int = None):
     """
-    Takes in the path to a zarr group and resizes the time dimension according to the provided finaltimelength
+    Takes in the path to a zarr group and resizes the time dimension according to the provided finaltimelength.  The
+    consolidated metadata of the group is rebuilt after the resize.
 
     Parameters
     ----------
@@ -163,15 +224,25 @@ def resize_zarr(zarrpth: str, finaltimelength: int = None):
     #    need to correct the index for it.
     rootgroup = zarr.open(zarrpth, mode='r+')
     if finaltimelength is None:
-        finaltimelength = np.count_nonzero(~np.isnan(rootgroup['time']))
-    for var in rootgroup.arrays():
-        if var[0] not in ['beam', 'sector', 'xyz']:
-            varname = var[0]
-            dims = rootgroup[varname].attrs['_ARRAY_DIMENSIONS']
-            time_index = dims.index('time')
-            new_shape = list(rootgroup[varname].shape)
-            new_shape[time_index] = finaltimelength
-            rootgroup[varname].resize(tuple(new_shape))
+        finaltimelength = np.count_nonzero(~np.isnan(rootgroup['time'][:]))
+
+    # build all the new shapes first, using the arrays from rootgroup.arrays() instead of looking each one up again
+    resize_ops = []
+    for varname, arr in rootgroup.arrays():
+        if varname not in ['beam', 'sector', 'xyz']:
+            dims = arr.attrs['_ARRAY_DIMENSIONS']
+            if 'time' in dims:
+                new_shape = list(arr.shape)
+                new_shape[dims.index('time')] = finaltimelength
+                resize_ops.append((arr, tuple(new_shape)))
+
+    # each resize rewrites the .zarray metadata for that array, do them all at once
+    if resize_ops:
+        with ThreadPoolExecutor(max_workers=min(8, len(resize_ops))) as executor:
+            list(executor.map(lambda op: op[0].resize(op[1]), resize_ops))
+    # this is the last step of the conversion write, rebuild the consolidated metadata with the final shapes so that
+    #  readers can open the store with a single metadata read
+    consolidate_metadata(zarrpth)
 
 
 def combine_xr_attributes(datasets: list):
@@ -196,11 +267,18 @@ def combine_xr_attributes(datasets: list):
 
     finaldict = {}
 
-    buffered_settings = ''
-    buffered_runtime_settings = ''
-
-    fnames = []
-    survey_nums = []
+    # serialized settings we have already saved, to skip duplicate entries
+    seen_settings = set()
+    seen_runtime_settings = set()
+
+    # unique file names and survey identifiers, sorted at the end
+    fnames = set()
+    survey_nums = set()
+    # collect all values for the min/max/serial number attributes, reduce them once at the end
+    min_values = defaultdict(list)
+    max_values = defaultdict(list)
+    serial_numbers = defaultdict(set)
+    first_serial_numbers = {}
     cast_dump = {}
     attrs_dump = {}
 
@@ -215,103 +293,81 @@ def combine_xr_attributes(datasets: list):
     for d in all_attrs:
         for k, v in d.items():
             # settings gets special treatment for a few reasons...
-            if k[0:7] == 'install':
-                vals = json.loads(v)  # stored as a json string for serialization reasons
+            if k.startswith('install'):
+                vals = _json_loads(v)  # stored as a json string for serialization reasons
                 try:
                     fname = vals.pop('raw_file_name')
-                    if fname not in fnames:
-                        # keep .all file names for their own attribute
-                        fnames.append(fname)
+                    # keep .all file names for their own attribute
+                    if isinstance(fname, list):
+                        fnames.update(fname)
+                    else:
+                        fnames.add(fname)
                 except KeyError:  # key exists in .all file but not in .kmall
                     pass
                     # print('{}: Unable to find "raw_file_name" key'.format(k))
                 try:
                     sname = vals.pop('survey_identifier')
-                    if sname not in survey_nums:
-                        # keep survey identifiers for their own attribute
-                        survey_nums.append(sname)
+                    # keep survey identifiers for their own attribute
+                    if isinstance(sname, list):
+                        survey_nums.update(sname)
+                    else:
+                        survey_nums.add(sname)
                 except KeyError:  # key exists in .all file but not in .kmall
                     pass
                     # print('{}: Unable to find "raw_file_name" key'.format(k))
                 vals = json.dumps(vals)
 
-                # This is for the duplicate entries, just ignore these
-                if vals == buffered_settings:
-                    pass
-                # this is for the first settings entry
-                elif not buffered_settings:
-                    buffered_settings = vals
+                # only save the unique entries, ignore the duplicates
+                if vals not in seen_settings:
+                    seen_settings.add(vals)
                     finaldict[k] = vals
-                # all unique entries after the first are saved
-                else:
-                    finaldict[k] = vals
-            elif k[0:7] == 'runtime':
-                vals = json.loads(v)  # stored as a json string for serialization reasons
-                # we pop out these three keys because they are unique across all runtime params.  You end up with like
-                # fourty records, all with only them being unique.  Not useful.  Rather only store important differences.
-                try:
-                    counter = vals.pop('Counter')
-                except KeyError:  # key exists in .all file but not in .kmall
-                    counter = ''
-                    # print('{}: Unable to find "raw_file_name" key'.format(k))
-                try:
-                    mindepth = vals.pop('MinDepth')
-                except KeyError:  # key exists in .all file but not in .kmall
-                    mindepth = ''
-                    # print('{}: Unable to find "MinDepth" key'.format(k))
-                try:
-                    maxdepth = vals.pop('MaxDepth')
-                except KeyError:  # key exists in .all file but not in .kmall
-                    maxdepth = ''
-                    # print('{}: Unable to find "MaxDepth" key'.format(k))
-                vals = json.dumps(vals)
-
-                # This is for the duplicate entries, just ignore these
-                if vals == buffered_runtime_settings:
-                    pass
-                # this is for the first settings entry
-                elif not buffered_runtime_settings:
-                    buffered_runtime_settings = vals
-                    vals = json.loads(v)
-                    vals['Counter'] = counter
-                    finaldict[k] = json.dumps(vals)
-                # all unique entries after the first are saved
-                else:
-                    vals = json.loads(v)
-                    vals['Counter'] = counter
-                    finaldict[k] = json.dumps(vals)
+            elif k.startswith('runtime'):
+                vals_full = _json_loads(v)  # stored as a json string for serialization reasons
+                # we leave out these three keys when comparing because they are unique across all runtime params.  You
+                # end up with like fourty records, all with only them being unique.  Not useful.  Rather only store
+                # important differences.
+                vals = _json_compare_key({ky: vl for ky, vl in vals_full.items() if ky not in ('Counter', 'MinDepth', 'MaxDepth')})
+                if 'Counter' not in vals_full:  # key exists in .all file but not in .kmall
+                    vals_full['Counter'] = ''
+
+                # only save the unique entries, ignore the duplicates
+                if vals not in seen_runtime_settings:
+                    seen_runtime_settings.add(vals)
+                    finaldict[k] = json.dumps(vals_full)
 
             # save all unique serial numbers
-            elif k in ['system_serial_number', 'secondary_system_serial_number'] and k in list(finaldict.keys()):
-                if finaldict[k] != v:
-                    finaldict[k] = np.array(finaldict[k])
-                    finaldict[k] = np.append(finaldict[k], v)
+            elif k in ('system_serial_number', 'secondary_system_serial_number'):
+                if k not in first_serial_numbers:
+                    first_serial_numbers[k] = v
+                serial_numbers[k].update(np.atleast_1d(v).tolist())
             # save all casts, use this to only pull the first unique cast later (casts are being saved in each line
             #   with a time stamp of when they appear in the data.  Earliest time represents the closest to the actual
             #   cast time).
-            elif k[0:7] == 'profile':
+            elif k.startswith('profile'):
                 cast_dump[k] = v
-            elif k[0:11] == 'attributes_':
+            elif k.startswith('attributes_'):
                 attrs_dump[k] = v
-            elif k[0:3] == 'min':
-                if k in finaldict:
-                    finaldict[k] = np.min([v, finaldict[k]])
-                else:
-                    finaldict[k] = v
-            elif k[0:3] == 'max':
-                if k in finaldict:
-                    finaldict[k] = np.max([v, finaldict[k]])
-                else:
-                    finaldict[k] = v
+            elif k.startswith('min'):
+                min_values[k].append(v)
+            elif k.startswith('max'):
+                max_values[k].append(v)
             elif k not in finaldict:
                 finaldict[k] = v
 
+    for k, vals in min_values.items():
+        finaldict[k] = min(vals)
+    for k, vals in max_values.items():
+        finaldict[k] = max(vals)
+    for k, vals in serial_numbers.items():
+        if len(vals) == 1:  # only one serial number, keep it as it was provided (a scalar stays a scalar)
+            first_val = first_serial_numbers[k]
+            finaldict[k] = first_val.tolist() if isinstance(first_val, np.ndarray) else first_val
+        else:
+            finaldict[k] = sorted(vals)
     if fnames:
-        finaldict['system_serial_number'] = finaldict['system_serial_number'].tolist()
-        finaldict['secondary_system_serial_number'] = finaldict['secondary_system_serial_number'].tolist()
-        finaldict['multibeam_files'] = list(np.unique(sorted(fnames)))
+        finaldict['multibeam_files'] = sorted(fnames)
     if survey_nums:
-        finaldict['survey_number'] = list(np.unique(survey_nums))
+        finaldict['survey_number'] = sorted(survey_nums)
     if cast_dump:
         sorted_kys = sorted(cast_dump)
         unique_casts = []
@@ -342,10 +398,10 @@ def divide_arrays_by_time_index(arrs: list, idx: np.array):
         list of indexed xarray DataArray or Dataset objects
     """
 
-    dat = []
-    for ar in arrs:
-        dat.append(ar[idx])
-    return dat
+    if isinstance(idx, np.ndarray) and idx.dtype == bool:
+        # convert the boolean mask to integer indices once, instead of in each array __getitem__
+        idx = np.flatnonzero(idx)
+    return [ar[idx] for ar in arrs]
 
 
 def combine_arrays_to_dataset(arrs: list, arrnames: list):
@@ -367,8 +423,15 @@ def combine_arrays_to_dataset(arrs: list, arrnames: list):
 
     if len(arrs) != len(arrnames):
         raise ValueError('Please provide an equal number of names to dataarrays')
-    dat = {a: arrs[arrnames.index(a)] for a in arrnames}
-    dset = xr.Dataset(dat)
+    # the arrays are generally all from the same chunk of the same dataset.  If they share the indexes of the first
+    #  array, build the dataset from the Variables and the coordinates of the first array, skipping the alignment and
+    #  coordinate merge of all the arrays
+    shared_indexes = arrs[0].indexes if arrs else {}
+    if arrs and all(dim in shared_indexes and arr.indexes[dim].equals(shared_indexes[dim]) for arr in arrs[1:]
+                    for dim in arr.indexes):
+        dset = xr.Dataset({nm: arr.variable for nm, arr in zip(arrnames, arrs)}, coords=arrs[0].coords)
+    else:
+        dset = xr.Dataset(dict(zip(arrnames, arrs)))
     return dset
 
 
@@ -436,31 +499,58 @@ def _interp_across_chunks_construct_times(xarr: Union[xr.Dataset, xr.DataArray],
         xarr_chunks = xarr.chunks[dimname]  # works for xarray Dataset
 
     chnk_end = np.cumsum(np.array(xarr_chunks)) - 1
-    chnk_end_time = xarr[dimname][chnk_end].values
+    # have to compute here, searchsorted not supported for dask arrays, but it is so much faster (should be sorted).
+    #  Compute the chunk end times and new_times together, one trip to the scheduler instead of one for each.  Numpy
+    #  arrays and non-dask DataArrays are passed through as is.
+    chnk_end_time, new_times_values = dask.compute(xarr[dimname][chnk_end], new_times)
+    chnk_end_time = np.array(chnk_end_time)
+    new_times_values = np.asarray(new_times_values)
 
     #  this is to ensure that we cover the desired time, extrapolate to cover the min/max desired time
     #  - when we break up the times to interp to (new_times) we want to ensure the last chunk covers all the end times
-    chnk_end_time[-1] = new_times[-1] + 1
-    try:
-        # have to compute here, searchsorted not supported for dask arrays, but it is so much faster (should be sorted)
-        endtime_idx = np.searchsorted(new_times.compute(), chnk_end_time)
-    except AttributeError:
-        # new_times is a numpy array, does not need compute
-        endtime_idx = np.searchsorted(new_times, chnk_end_time)
+    chnk_end_time[-1] = new_times_values[-1] + 1
+    endtime_idx = np.searchsorted(new_times_values, chnk_end_time)
 
     chnkwise_times = np.split(new_times, endtime_idx)[:-1]  # drop the last, its empty
 
     # build out the slices
     # add one to get the next entry for each chunk
     slices_endtime_idx = np.insert(chnk_end + 1, 0, 0)
-    chnk_idxs = [[slices_endtime_idx[i], slices_endtime_idx[i+1]] for i in range(len(slices_endtime_idx)-1)]
 
     # only return chunk blocks that have valid times in them
-    empty_chunks = np.array([chnkwise_times.index(i) for i in chnkwise_times if i.size == 0])
-    for idx in empty_chunks[::-1]:  # go backwards to preserve index in list as we remove elements
-        del chnk_idxs[idx]
-        del chnkwise_times[idx]
-    return chnk_idxs, chnkwise_times
+    chnk_idxs = []
+    valid_chnkwise_times = []
+    for chnk_start, chnk_stop, chnk_times in zip(slices_endtime_idx[:-1], slices_endtime_idx[1:], chnkwise_times):
+        if chnk_times.size:
+            chnk_idxs.append([chnk_start, chnk_stop])
+            valid_chnkwise_times.append(chnk_times)
+    return chnk_idxs, valid_chnkwise_times
+
+
+def _nearest_sorted_value(vals: np.ndarray, target: float):
+    """
+    Return the value in the sorted array vals that is nearest to target.  Ties go to the larger value, the same as
+    xarray sel with method='nearest'.
+
+    Parameters
+    ----------
+    vals
+        sorted 1d numpy array
+    target
+        value to search for
+
+    Returns
+    -------
+    float
+        nearest value in vals
+    """
+
+    idx = np.searchsorted(vals, target)
+    if idx >= len(vals):
+        idx = len(vals) - 1
+    elif idx > 0 and abs(vals[idx - 1] - target) < abs(vals[idx] - target):
+        idx -= 1
+    return float(vals[idx])
 
 
 def slice_xarray_by_dim(arr: Union[xr.Dataset, xr.DataArray], dimname: str = 'time', start_time: float = None,
@@ -493,19 +583,21 @@ def slice_xarray_by_dim(arr: Union[xr.Dataset, xr.DataArray], dimname: str = 'ti
     if start_time is None and end_time is None:
         return arr
 
+    # sorted times, find the nearest with searchsorted instead of building a pandas index lookup with sel for each time
+    times = np.asarray(arr[dimname].values)
     if start_time is not None:
-        nearest_start = float(arr[dimname].sel(time=start_time, method='nearest'))
+        nearest_start = _nearest_sorted_value(times, start_time)
     else:
-        nearest_start = float(arr[dimname][0])
+        nearest_start = float(times[0])
 
     if end_time is not None:
-        nearest_end = float(arr[dimname].sel(time=end_time, method='nearest'))
+        nearest_end = _nearest_sorted_value(times, end_time)
     else:
-        nearest_end = float(arr[dimname][-1])
+        nearest_end = float(times[-1])
 
     if start_time is not None and end_time is not None:
         if nearest_end == nearest_start:
-            if (nearest_end == float(arr[dimname][-1])) or (nearest_end == float(arr[dimname][0])):
+            if (nearest_end == float(times[-1])) or (nearest_end == float(times[0])):
                 # if this is true, you have start/end times that are outside the scope of the data.  The start/end times will
                 #  be equal to either the start of the dataset or the end of the dataset, depending on when they fall
                 return None
@@ -514,6 +606,27 @@ def slice_xarray_by_dim(arr: Union[xr.Dataset, xr.DataArray], dimname: str = 'ti
     return rnav
 
 
+def _unwrap_heading(heading: xr.DataArray):
+    """
+    Unwrap the heading (in degrees) to get rid of the 360 -> 0 jumps, so that it can be interpolated.  See
+    numba_helpers.unwrap_degrees.
+
+    Parameters
+    ----------
+    heading
+        1dim (time) DataArray of heading in degrees
+
+    Returns
+    -------
+    xr.DataArray
+        float32 unwrapped heading
+    """
+
+    unwrapped = np.empty(heading.shape[0], dtype=np.float32)
+    unwrap_degrees(np.asarray(heading.values), unwrapped)
+    return xr.DataArray(unwrapped, coords=[heading.time], dims=['time'])
+
+
 def interp_across_chunks(xarr: Union[xr.Dataset, xr.DataArray], new_times: xr.DataArray, dimname: str = 'time',
                          daskclient: Client = None):
     """
@@ -554,15 +667,16 @@ def interp_across_chunks(xarr: Union[xr.Dataset, xr.DataArray], new_times: xr.Da
     if type(xarr) == xr.DataArray:
         if xarr.name == 'heading':
             needs_reverting = True
-            xarr = xr.DataArray(np.float32(np.rad2deg(np.unwrap(np.deg2rad(xarr)))), coords=[xarr.time], dims=['time'])
+            xarr = _unwrap_heading(xarr)
     else:
         if 'heading' in list(xarr.data_vars.keys()):
             needs_reverting = True
-            xarr['heading'] = xr.DataArray(np.float32(np.rad2deg(np.unwrap(np.deg2rad(xarr.heading)))), coords=[xarr.time],
-                                           dims=['time'])
+            xarr['heading'] = _unwrap_heading(xarr.heading)
 
     chnk_idxs, chnkwise_times = _interp_across_chunks_construct_times(xarr, new_times, dimname)
-    xarrs_chunked = [xarr.isel({dimname: slice(i, j)}).chunk(j-i,) for i, j in chnk_idxs]
+    # chnk_idxs are the existing chunk boundaries of xarr, so each slice is already a single chunk (or numpy backed if
+    #  xarr is not chunked), no need to rechunk
+    xarrs_chunked = [xarr.isel({dimname: slice(i, j)}) for i, j in chnk_idxs]
     if daskclient is None:
         interp_arrs = []
         for ct, xar in enumerate(xarrs_chunked):
@@ -639,36 +753,102 @@ def stack_nan_array(dataarray: xr.DataArray, stack_dims: tuple = ('time', 'beam'
     np.array
         indexes of the original data
     xr.DataArray
-        xarray DataArray, multiindexed and flattened
+        xarray DataArray, flattened along a new 'stck' dimension with no coordinates, use the indexes to get back to
+        the original positions
     """
 
-    orig_idx = np.where(~np.isnan(dataarray))
-    dataarray_stck = dataarray.stack(stck=stack_dims)
-    nan_idx = ~np.isnan(dataarray_stck).compute()
-    dataarray_stck = dataarray_stck[nan_idx]
+    orig_idx, flat = stack_nan_array_flat(dataarray, stack_dims=stack_dims)
+    dataarray_stck = xr.DataArray(flat, dims=['stck'], name=dataarray.name, attrs=dataarray.attrs)
     return orig_idx, dataarray_stck
 
 
+def stack_nan_array_flat(dataarray: xr.DataArray, stack_dims: tuple = ('time', 'beam')):
+    """
+    stack_nan_array without the xarray wrapper, for when you only need the valid values as a numpy array.
+
+    Parameters
+    ----------
+    dataarray
+        xarray DataArray, array that we need to flatten and index non-NaN values
+    stack_dims
+        tuple, dims of our input data
+
+    Returns
+    -------
+    tuple
+        tuple of numpy arrays, indexes of the original data
+    np.ndarray
+        1d array of the non-NaN values
+    """
+
+    # build the mask once on the numpy array and index the flattened values with it, instead of building the
+    #  time/beam MultiIndex with DataArray.stack and running isnan a second time on the stacked array
+    vals = dataarray.transpose(*stack_dims).values
+    valid = ~np.isnan(vals)
+    return np.nonzero(valid), vals[valid]
+
+
+def _reform_nan_numpy(values: np.ndarray, orig_idx: tuple, orig_shape: tuple, dtype: np.dtype):
+    """
+    Numpy part of reform_nan_array, build the NaN filled array of orig_shape and populate it with values at orig_idx
+
+    Parameters
+    ----------
+    values
+        flattened valid values
+    orig_idx
+        indexes of the values in the output array, see np.nonzero
+    orig_shape
+        shape of the output array
+    dtype
+        dtype of the output array, must be able to hold NaN
+
+    Returns
+    -------
+    np.ndarray
+        values of arr, filled to be square with NaN values
+    """
+
+    idx_shape = tuple(orig_shape[:len(orig_idx)])
+    total_cells = int(np.prod(idx_shape))
+    if total_cells and len(orig_idx[0]) >= 0.95 * total_cells:
+        # nearly every cell is valid and is about to be overwritten, only fill the few missing cells with NaN
+        final_arr = np.empty(orig_shape, dtype=dtype)
+        missing = np.ones(idx_shape, dtype=bool)
+        missing[orig_idx] = False
+        final_arr[missing] = np.nan
+    else:
+        final_arr = np.full(orig_shape, np.nan, dtype=dtype)
+    final_arr[orig_idx] = values
+    return final_arr
+
+
 def reform_nan_array(dataarray_stack: xr.DataArray, orig_idx: tuple, orig_shape: tuple, orig_coords: xr.DataArray,
-                     orig_dims: tuple):
+                     orig_dims: tuple, chunks: int = None):
     """
     To handle NaN values in our input arrays, we flatten and index only the valid values.  Here we rebuild the
     original square shaped arrays we need using one of the original arrays as reference.
 
     See stack_nan_array.  Run this on the stacked output to get the original dimensions back.
 
+    If chunks is provided, the array is built lazily as a dask array, chunked along the first dimension, so that only
+    one chunk of the full size array is in memory at a time when it is computed.
+
     Parameters
     ----------
     dataarray_stack
         flattened array that we just interpolated
     orig_idx
-        2 elements, one for 1st dimension indexes and one for 2nd dimension indexes, see np.where
+        2 elements, one for 1st dimension indexes and one for 2nd dimension indexes, see np.where.  1st dimension
+        indexes must be sorted (as returned by np.where/np.nonzero) if chunks is provided
     orig_shape
         original shape of array before stack_nan_array
     orig_coords
         coordinates from array before stack_nan_array
     orig_dims
         original dims of array before stack_nan_array
+    chunks
+        optional, length of the 1st dimension of each chunk, if provided returns a dask backed DataArray
 
     Returns
     -------
@@ -676,14 +856,58 @@ def reform_nan_array(dataarray_stack: xr.DataArray, orig_idx: tuple, orig_shape:
         values of arr, filled to be square with NaN values, coordinates of ref_array
     """
 
-    final_arr = np.empty(orig_shape, dtype=dataarray_stack.dtype)
-    final_arr[:] = np.nan
-    final_arr[orig_idx] = dataarray_stack
+    # integer data can not hold NaN, promote to a float type
+    dtype = np.result_type(dataarray_stack.dtype, np.float32)
+    if chunks is None or not orig_shape[0]:
+        final_arr = _reform_nan_numpy(dataarray_stack, orig_idx, orig_shape, dtype)
+    else:
+        values = np.asarray(dataarray_stack)
+        blocks = []
+        for chnk_start in range(0, orig_shape[0], chunks):
+            chnk_end = min(chnk_start + chunks, orig_shape[0])
+            # values are in 1st dimension order, the values for this chunk are a contiguous slice
+            first, last = np.searchsorted(orig_idx[0], [chnk_start, chnk_end])
+            chnk_idx = (orig_idx[0][first:last] - chnk_start,) + tuple(idx[first:last] for idx in orig_idx[1:])
+            chnk_shape = (chnk_end - chnk_start,) + tuple(orig_shape[1:])
+            blocks.append(da.from_delayed(dask.delayed(_reform_nan_numpy)(values[first:last], chnk_idx, chnk_shape, dtype),
+                                          shape=chnk_shape, dtype=dtype))
+        final_arr = da.concatenate(blocks, axis=0)
     final_arr = xr.DataArray(final_arr, coords=orig_coords, dims=orig_dims)
     return final_arr
 
 
-def reload_zarr_records(pth: str, skip_dask: bool = False, sort_by: str = None):
+@lru_cache(maxsize=16)
+def _open_consolidated_zarr(pth: str, skip_dask: bool, chunked: bool, zmetadata_stamp: tuple):
+    """
+    Cached open of a zarr data store with consolidated metadata, see reload_zarr_records.  zmetadata_stamp is the
+    (mtime, size) of the .zmetadata file, which is rewritten after every write (see backends._zarr.consolidate_metadata),
+    so a write to the store is a new cache key and the store is opened again.  Use _open_consolidated_zarr.cache_clear()
+    to force a fresh open.
+
+    Parameters
+    ----------
+    pth
+        string, path to xarray Dataset stored as zarr datastore
+    skip_dask
+        if True, skip the dask process synchronizer as you are not running dask distributed
+    chunked
+        if True, will return dask arrays chunked the same as the zarr arrays
+    zmetadata_stamp
+        (mtime in nanoseconds, size) of the .zmetadata file, only used as part of the cache key
+
+    Returns
+    -------
+    xr.Dataset
+        the opened zarr data store, shared between callers, do not modify in place
+    """
+
+    chunks = {} if chunked else None
+    sync = zarr.ProcessSynchronizer(pth + '.sync') if not skip_dask else None
+    return xr.open_zarr(pth, synchronizer=sync, consolidated=True, chunks=chunks, **_zarr_decode_options)
+
+
+def reload_zarr_records(pth: str, skip_dask: bool = False, sort_by: str = None, consolidated: bool = False,
+                        chunked: bool = True):
     """
     After writing new data to the zarr data store, you need to refresh the xarray Dataset object so that it
     sees the changes.  We do that here by just re-running open_zarr.
@@ -705,18 +929,32 @@ def reload_zarr_records(pth: str, skip_dask: bool = False, sort_by: str = None):
         if True, skip the dask process synchronizer as you are not running dask distributed
     sort_by
         optional, will sort by the dimension provided, if provided (ex: 'time')
+    consolidated
+        if True, will open using the consolidated metadata (.zmetadata) of the store, a single read instead of one read
+        per array.  Falls back to the normal open if the store does not have consolidated metadata.  Consolidated opens
+        are cached until the next write to the store, so reloading a store that has not changed is free.
+    chunked
+        if True, will return dask arrays chunked the same as the zarr arrays.  If False, will return lazily loaded
+        numpy backed arrays, skips building the dask graph for each array when you only need the metadata/coordinates
+        or a small part of the data.
     """
 
     if os.path.exists(pth):
-        sync = zarr.ProcessSynchronizer(pth + '.sync')
-        if not skip_dask:
-            data = xr.open_zarr(pth, synchronizer=sync,
-                                mask_and_scale=False, decode_coords=False, decode_times=False,
-                                decode_cf=False, concat_characters=False)
+        zmetadata_stat = None
+        if consolidated:
+            try:
+                zmetadata_stat = os.stat(os.path.join(pth, '.zmetadata'))
+            except FileNotFoundError:
+                pass
+        if zmetadata_stat is not None:
+            # shallow copy, so callers that set attributes do not change the cached dataset
+            data = _open_consolidated_zarr(pth, skip_dask, chunked,
+                                           (zmetadata_stat.st_mtime_ns, zmetadata_stat.st_size)).copy(deep=False)
         else:
-            data = xr.open_zarr(pth, synchronizer=None,
-                                mask_and_scale=False, decode_coords=False, decode_times=False,
-                                decode_cf=False, concat_characters=False)
+            # chunks={} uses the chunks of the zarr arrays as they are, chunks=None does not use dask at all
+            chunks = {} if chunked else None
+            sync = zarr.ProcessSynchronizer(pth + '.sync') if not skip_dask else None
+            data = xr.open_zarr(pth, synchronizer=sync, consolidated=False, chunks=chunks, **_zarr_decode_options)
         if sort_by:
             return data.sortby(sort_by)
         else:
@@ -752,61 +990,129 @@ def return_chunk_slices(xarr: xr.Dataset):
         print('Only xarray objects are supported')
         return None
 
-    chunk_dim = chunk_dim[0]
-    chunks = list(xarr.chunks.values())[0]
-    chunk_size = chunks[0]
-    chunk_slices = [slice(i * chunk_size, i * chunk_size + chunk_size) for i in range(len(chunks))]
+    # chunk boundaries from the cumulative sum of the actual chunk sizes, covers the partial last chunk as well
+    chunk_ends = np.cumsum(xarr.chunks[chunk_dim[0]]).tolist()
+    chunk_slices = [slice(start, end) for start, end in zip([0] + chunk_ends[:-1], chunk_ends)]
+    return chunk_slices
+
+
+def return_chunk_slices_from_zarr(pth: str, dimname: str = 'time'):
+    """
+    return_chunk_slices for a zarr data store on disk, built from the chunks/shape in the zarr metadata of the dimname
+    array, without opening the store as an xarray Dataset and building the dask arrays to get the chunks.
+
+    Parameters
+    ----------
+    pth
+        path to the zarr data store
+    dimname
+        name of the dimension (and of the coordinate array in the zarr store) to slice along
 
-    # have to correct last slice, as last chunk is equal to the length of the array modulo chunk size
-    total_len = xarr.dims[chunk_dim]
-    last_chunk_size = xarr.dims[chunk_dim] % chunk_size
-    if last_chunk_size:
-        chunk_slices[-1] = slice(total_len - last_chunk_size, total_len)
-    else:  # last slice fits perfectly, they have no remainder some how
-        pass
+    Returns
+    -------
+    list
+        list of slices for the indices of each chunk
+    """
 
+    dim_array = open_zarr_readonly(pth)[dimname]
+    chunk_size = dim_array.chunks[0]
+    total_len = dim_array.shape[0]
+    chunk_slices = [slice(start, min(start + chunk_size, total_len)) for start in range(0, total_len, chunk_size)]
     return chunk_slices
 
 
-def _find_gaps_split(datagap_times: list, existing_gap_times: list):
+def _subtract_gaps(datagap_times: np.ndarray, existing_gap_times: np.ndarray):
     """
-    helper for compare_and_find_gaps.  A function to use in a loop to continue splitting gaps until they no longer
-    include any existing gaps
+    helper for compare_and_find_gaps.  Remove the existing gaps from the data gaps, splitting data gaps that contain
+    existing gaps and trimming data gaps that partially overlap them.  Data gaps entirely within an existing gap are
+    dropped.
 
     datagap_times = [[0,5], [30,40], [70, 82], [90,100]]
 
     existing_gap_times = [[10,15], [35,45], [75,80], [85,95]]
 
-    split_dgtime = [[0, 5], [30, 40], [70, 75], [80, 82], [90, 100]]
+    returns [[0, 5], [30, 35], [70, 75], [80, 82], [95, 100]]
+
+    A searchsorted on the sorted existing gaps finds the existing gaps that overlap each data gap.  Data gaps with no
+    or one overlapping existing gap (almost all of them) are clipped with array operations, only data gaps that
+    overlap several existing gaps are walked one at a time.
 
     Parameters
     ----------
     datagap_times
-        list, list of two element lists (start time, end time) for the gaps found in the new data
+        numpy array, nx2 (start time, end time) for the gaps found in the new data
     existing_gap_times
-        list, list of two element lists (start time, end time) for the gaps found in the existing data
+        numpy array, mx2 (start time, end time) for the gaps found in the existing data
 
     Returns
     -------
-    list
-        list of two element lists (start time, end time) for the new data gaps split around the existing data gaps
-    """
-
-    split = False
-    split_dgtime = []
-    for dgtime in datagap_times:
-        for existtime in existing_gap_times:
-            # datagap contains an existing gap, have to split the datagap
-            if (dgtime[0] <= existtime[0] <= dgtime[1]) and (dgtime[0] <= existtime[1] <= dgtime[1]):
-                split_dgtime.append([dgtime[0], existtime[0]])
-                split_dgtime.append([existtime[1], dgtime[1]])
-                split = True
-                break
-        if not split:
-            split_dgtime.append(dgtime)
-        else:
-            split = False
-    return split_dgtime
+    np.ndarray
+        numpy array, nx2 (start time, end time) for the new data gaps with the existing data gaps removed
+    """
+
+    existing_gap_times = np.asarray(existing_gap_times, dtype=np.float64).reshape(-1, 2)
+    existing_gap_times = existing_gap_times[np.argsort(existing_gap_times[:, 0], kind='stable')]
+    ex_start = existing_gap_times[:, 0]
+    ex_end = existing_gap_times[:, 1]
+    # running max of the end times, so that it is sorted even if existing gaps overlap
+    ex_end_max = np.maximum.accumulate(ex_end) if ex_end.size else ex_end
+
+    datagap_times = np.asarray(datagap_times, dtype=np.float64).reshape(-1, 2)
+    dg_start, dg_end = datagap_times[:, 0], datagap_times[:, 1]
+    # existing gaps that overlap each data gap, end after the data gap start and start before the data gap end
+    first = np.searchsorted(ex_end_max, dg_start, side='right')
+    last = np.searchsorted(ex_start, dg_end, side='left')
+    overlaps = np.clip(last - first, 0, None)
+    rows = np.arange(datagap_times.shape[0])
+
+    # build pieces as (data gap row, piece number, start, end) so we can put them back in data gap order at the end
+    # no overlapping existing gap, the data gap is unchanged
+    no_ovlp = overlaps == 0
+    pieces = [np.column_stack([rows[no_ovlp], np.zeros(np.count_nonzero(no_ovlp)), dg_start[no_ovlp], dg_end[no_ovlp]])]
+    # one overlapping existing gap (the common case), the part before and the part after the existing gap
+    one_ovlp = overlaps == 1
+    ex_idx = first[one_ovlp]
+    pieces.append(np.column_stack([rows[one_ovlp], np.zeros(ex_idx.size), dg_start[one_ovlp],
+                                   np.minimum(ex_start[ex_idx], dg_end[one_ovlp])]))
+    pieces.append(np.column_stack([rows[one_ovlp], np.ones(ex_idx.size),
+                                   np.maximum(ex_end[ex_idx], dg_start[one_ovlp]), dg_end[one_ovlp]]))
+    # several overlapping existing gaps, walk through them
+    for row in np.flatnonzero(overlaps > 1):
+        current = dg_start[row]
+        walk_pieces = []
+        for idx in range(first[row], last[row]):
+            walk_pieces.append([row, len(walk_pieces), current, ex_start[idx]])
+            current = max(current, ex_end[idx])
+        walk_pieces.append([row, len(walk_pieces), current, dg_end[row]])
+        pieces.append(np.array(walk_pieces, dtype=np.float64))
+
+    pieces = np.vstack(pieces)
+    # drop the empty pieces, where the existing gap covers the start/end (or all) of the data gap
+    pieces = pieces[pieces[:, 3] > pieces[:, 2]]
+    pieces = pieces[np.lexsort((pieces[:, 1], pieces[:, 0]))]
+    return np.ascontiguousarray(pieces[:, 2:])
+
+
+def _find_gap_times(times: np.ndarray, max_gap_length: float):
+    """
+    helper for compare_and_find_gaps.  Return the (start time, end time) of each gap in times greater than
+    max_gap_length
+
+    Parameters
+    ----------
+    times
+        numpy array, sorted times
+    max_gap_length
+        maximum acceptable gap
+
+    Returns
+    -------
+    np.ndarray
+        numpy array, nx2 (start time, end time) for each gap
+    """
+
+    gaps = np.flatnonzero(np.diff(times) > max_gap_length)
+    return np.column_stack([times[gaps], times[gaps + 1]]).astype(np.float64)
 
 
 def compare_and_find_gaps(source_dat: Union[xr.DataArray, xr.Dataset], new_dat: Union[xr.DataArray, xr.Dataset],
@@ -834,44 +1140,26 @@ def compare_and_find_gaps(source_dat: Union[xr.DataArray, xr.Dataset], new_dat:
         numpy array, nx2 where n is the number of gaps found
     """
 
+    source_times = np.asarray(source_dat[dimname].values)
+    new_times = np.asarray(new_dat[dimname].values)
+
     # gaps in source, if a gap in the new data is within a gap in the source, it is not a gap
-    existing_gaps = np.argwhere(source_dat[dimname].diff(dimname).values > max_gap_length)
-    existing_gap_times = [[float(source_dat[dimname][gp]), float(source_dat[dimname][gp + 1])] for gp in existing_gaps]
+    existing_gap_times = _find_gap_times(source_times, max_gap_length)
 
     # look for gaps in the new data
-    datagaps = np.argwhere(new_dat[dimname].diff(dimname).values > max_gap_length)
-    datagap_times = [[float(new_dat[dimname][gp]), float(new_dat[dimname][gp + 1])] for gp in datagaps]
-
-    # consider postprocessed nav starting too late or ending too early as a gap as well
-    if new_dat[dimname].min() > source_dat[dimname].time.min() + max_gap_length:
-        datagap_times.insert([float(source_dat[dimname].time.min()), float(new_dat[dimname].min())])
-    if new_dat[dimname].max() + max_gap_length < source_dat[dimname].time.max():
-        datagap_times.append([float(new_dat[dimname].max()), float(source_dat[dimname].time.max())])
-
-    # first, split all the gaps if they contain existing time gaps, keep going until you no longer find contained gaps
-    splitting = True
-    while splitting:
-        dg_split_gaps = _find_gaps_split(datagap_times, existing_gap_times)
-        if dg_split_gaps != datagap_times:  # you split
-            datagap_times = dg_split_gaps
-        else:
-            splitting = False
+    datagap_times = _find_gap_times(new_times, max_gap_length)
 
-    # next adjust gap boundaries if they overlap with existing gaps
-    finalgaps = []
-    for dgtime in datagap_times:
-        for existtime in existing_gap_times:
-            # datagap is fully within an existing gap in the source data, just dont include it
-            if (existtime[0] <= dgtime[0] <= existtime[1]) and (existtime[0] <= dgtime[1] <= existtime[1]):
-                continue
-            # partially covered
-            if existtime[0] < dgtime[0] < existtime[1]:
-                dgtime[0] = existtime[1]
-            elif existtime[0] < dgtime[1] < existtime[1]:
-                dgtime[1] = existtime[0]
-        finalgaps.append(dgtime)
+    # consider postprocessed nav starting too late or ending too early as a gap as well.  Times are sorted (the gap
+    #   search above depends on it), so the first/last times are the min/max
+    source_start, source_end = float(source_times[0]), float(source_times[-1])
+    new_start, new_end = float(new_times[0]), float(new_times[-1])
+    if new_start > source_start + max_gap_length:
+        datagap_times = np.vstack([[source_start, new_start], datagap_times])
+    if new_end + max_gap_length < source_end:
+        datagap_times = np.vstack([datagap_times, [new_end, source_end]])
 
-    return np.array(finalgaps)
+    # split/trim the gaps around the existing time gaps, drop gaps that are entirely within existing gaps
+    return _subtract_gaps(datagap_times, existing_gap_times)
 
 
 def get_beamwise_interpolation(pingtime: xr.DataArray, additional: xr.DataArray, interp_this: xr.DataArray):
@@ -901,8 +1189,8 @@ def get_beamwise_interpolation(pingtime: xr.DataArray, additional: xr.DataArray,
     """
 
     beam_tstmp = pingtime + additional
-    rx_tstmp_idx, rx_tstmp_stck = stack_nan_array(beam_tstmp, stack_dims=('time', 'beam'))
-    unique_rx_times, inv_idx = np.unique(rx_tstmp_stck.values, return_inverse=True)
+    rx_tstmp_idx, rx_tstmp_stck = stack_nan_array_flat(beam_tstmp, stack_dims=('time', 'beam'))
+    unique_rx_times, inv_idx = np.unique(rx_tstmp_stck, return_inverse=True)
     rx_interptimes = xr.DataArray(unique_rx_times, coords=[unique_rx_times], dims=['time']).chunk()
 
     interpolated_flattened = interp_across_chunks(interp_this, rx_interptimes.compute())
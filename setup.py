@@ -18,24 +18,21 @@ VERSION = ''
 
 # What packages are required for this module to be executed?
 REQUIRED = [
-            'bokeh==2.3.0',
             'dask==2021.3.0',
             'distributed==2021.3.0',
             'fasteners==0.14.1',
             'laspy==1.7.0',
             'matplotlib==3.3.4',  # >=3.3.3 required, FuncAnimation and Pyside2/matplotlib do not play well in 3.2.1
-            'numba==0.52.0',
+            'numba>=0.55.2,<0.57',  # numpy 1.21 support added in 0.55, numpy 1.22 in 0.55.2
             'openpyxl==3.0.6',
             'psutil==5.8.0',
-            'numpy==1.20.1',  # cannot be 1.19.4, see https://tinyurl.com/y3dm3h86
+            'numpy>=1.20.1,<1.23',  # cannot be 1.19.4, see https://tinyurl.com/y3dm3h86
             'pandas==1.2.3',
             'pyshp==2.1.3',
             'pyepsg==0.4.0',  # cartopy requirement not installed with conda install, duplicates pyproj functionality...
-            'pyopengl==3.1.5',
             'pyproj==3.0.1',
-            'pyqtgraph==0.11.1',
             's3fs==0.5.2',
-            'scipy==1.6.0',
+            'scipy>=1.6.0,<1.10',
             'shapely==1.7.1',
             'sortedcontainers==2.3.0',
             'watchdog==1.0.2',
@@ -58,6 +55,10 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
           'entwine export': ['entwine', 'nodejs'],
+          'fast json': ['orjson'],
+          'gui': ['bokeh==2.3.0',  # dask distributed dashboard
+                  'pyopengl==3.1.5',
+                  'pyqtgraph==0.11.1'],
           }
 
 # The rest you shouldn't have to touch too much :)
@@ -1,6 +1,7 @@
+import tempfile
 from HSTB.kluster.backends._zarr import *
 from HSTB.kluster.backends._zarr import _get_indices_dataset_exists, _get_indices_dataset_notexist, \
-    _my_xarr_to_zarr_build_arraydimensions, _my_xarr_to_zarr_writeattributes
+    _my_xarr_to_zarr_build_arraydimensions, _my_xarr_to_zarr_writeattributes, _attribute_hash_key
 
 
 def test_search_not_sorted():
@@ -93,6 +94,12 @@ def test_xarr_to_zarr_writeattributes():
     assert rootgroup.attrs['test4'] == {'line1': ['name', 123, 456], 'line2': ['nametwo', 345, 457]}
 
 
+def test_attribute_hash_key():
+    assert _attribute_hash_key({'a': 1, 'b': [1, 2]}) == _attribute_hash_key({'b': [1, 2], 'a': 1})
+    assert _attribute_hash_key({'a': np.array([1, 2])}) == _attribute_hash_key({'a': [1, 2]})
+    assert _attribute_hash_key({'a': 1}) != _attribute_hash_key({'a': 2})
+
+
 def test_get_write_indices_zarr_outoforder():
     # now check to make sure this all works when the already written data is out of time order
     zarr_time = zarr.array([5, 6, 7, 8, 9, 0, 1, 2, 3, 4])
@@ -195,3 +202,52 @@ def test_zarr_write_merge():
     assert np.array_equal(zw.rootgroup['data'], data_arr)
     assert np.array_equal(zw.rootgroup['data2'], data_arr)
     assert np.array_equal(zw.rootgroup['time'], data_arr)
+
+
+def test_zarr_write_expand_dim():
+    # new data has more beams than the existing rootgroup, the existing data is padded with the no data value
+    zw = ZarrWrite(None, desired_chunk_shape={'time': (10,), 'beam': (5,), 'data': (10, 5)})
+    zw.rootgroup = zarr.group()
+
+    data_time = np.arange(10)
+    indices, running_total = _get_indices_dataset_notexist([data_time])
+    dataset = xr.Dataset({'data': (['time', 'beam'], np.ones((10, 3)))}, coords={'time': data_time, 'beam': np.arange(3)})
+    zw.write_to_zarr(dataset, None, dataloc=indices[0], finalsize=10)
+
+    data_time2 = np.arange(10, 15)
+    indices, running_total = _get_indices_dataset_exists([data_time2], zw.rootgroup['time'])
+    dataset = xr.Dataset({'data': (['time', 'beam'], np.full((5, 5), 2.0))}, coords={'time': data_time2, 'beam': np.arange(5)})
+    zw.write_to_zarr(dataset, None, dataloc=indices[0], finalsize=15)
+
+    assert zw.rootgroup['data'].shape == (15, 5)
+    assert np.array_equal(zw.rootgroup['beam'], np.arange(5))
+    assert (zw.rootgroup['data'][:10, :3] == 1).all()
+    assert np.isnan(zw.rootgroup['data'][:10, 3:]).all()
+    assert (zw.rootgroup['data'][10:] == 2).all()
+
+
+def test_direct_io_directory_store():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = DirectIODirectoryStore(os.path.join(tmpdir, 'test.zarr'))
+        rootgroup = zarr.open(store, mode='a')
+        data_arr = np.arange(10000, dtype=np.float32)
+        newarr = rootgroup.create_dataset('data', shape=(10000,), chunks=(3000,), dtype=np.float32)
+        newarr[:] = data_arr
+        reopened = zarr.open(os.path.join(tmpdir, 'test.zarr'), mode='r')
+        assert np.array_equal(reopened['data'][:], data_arr)
+
+
+def test_direct_io_directory_store_batched_writes():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = DirectIODirectoryStore(os.path.join(tmpdir, 'test.zarr'))
+        rootgroup = zarr.open(store, mode='a')
+        data_arr = np.arange(10000, dtype=np.float32)
+        newarr = rootgroup.create_dataset('data', shape=(10000,), chunks=(3000,), dtype=np.float32)
+        with store.batched_writes():
+            newarr[:] = data_arr
+            # queued chunks are not on disk yet, but can be read back from the store
+            assert not os.path.exists(os.path.join(tmpdir, 'test.zarr', 'data', '0'))
+            assert np.array_equal(newarr[:], data_arr)
+        assert os.path.exists(os.path.join(tmpdir, 'test.zarr', 'data', '0'))
+        reopened = zarr.open(os.path.join(tmpdir, 'test.zarr'), mode='r')
+        assert np.array_equal(reopened['data'][:], data_arr)
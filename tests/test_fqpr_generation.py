@@ -192,6 +192,27 @@ def test_converted_data_content():
     out = None
 
 
+def test_process_multibeam_skips_tpu():
+    if not os.path.exists(datapath):
+        print('Please run test_process_testfile first')
+    out = reload_data(datapath)
+    tpu_runs = []
+    calculate_total_uncertainty = out.calculate_total_uncertainty
+
+    def counted_tpu(*args, **kwargs):
+        tpu_runs.append(1)
+        return calculate_total_uncertainty(*args, **kwargs)
+
+    out.calculate_total_uncertainty = counted_tpu
+    # same inputs as test_process_testfile, the saved tpu signature matches and tpu is not run again
+    out = process_multibeam(out)
+    assert not tpu_runs
+    assert 'tvu' in out.multibeam.raw_ping[0]
+
+    out.close()
+    out = None
+
+
 def test_export_files():
     if not os.path.exists(datapath):
         print('Please run test_process_testfile first')
@@ -600,6 +621,17 @@ def test_interp_across_chunks():
     print('Passed: interp_across_chunks')
 
 
+def test_dual_ping_mask():
+    from HSTB.kluster.fqpr_convenience import _dual_ping_mask
+    # pairs of records with the same time and a time jump between each pair, the last record is a new ping time
+    kongs_tm = np.array([0.0, 0.0, 1.0, 1.0, 2.0, 3.0])
+    # includes the first and the last record, neighbours past either end are clipped to the record itself
+    idx = np.array([0, 1, 5])
+    assert np.array_equal(_dual_ping_mask(kongs_tm, idx), np.array([False, True, True]))
+    # single record, no neighbours at all
+    assert not _dual_ping_mask(np.array([5.0]), np.array([0])).any()
+
+
 def test_basesurface():
     x = np.linspace(538900, 539300, 1000).astype(np.float32)
     y = np.linspace(5292800, 5293300, 1000).astype(np.float32)
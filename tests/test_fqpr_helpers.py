@@ -20,6 +20,29 @@ def test_epsg_determinator():
     assert epsg_determinator('wgs84', 25, 'S') == 32725
 
 
+def test_build_crs_epsg():
+    assert build_crs_epsg(zone_num='12N', datum='nad83') == (6341, '')
+    assert build_crs_epsg(zone_num='12S', datum='WGS84') == (32712, '')
+    assert build_crs_epsg(datum='WGS84', projected=False) == (kluster_variables.epsg_wgs84, '')
+    assert build_crs_epsg(epsg='26910') == (26910, '')
+    code, err = build_crs_epsg(zone_num='12N', datum='ITRF')
+    assert code is None
+    assert err
+
+
+def test_build_crs_batch():
+    specs = [{'zone_num': '12N', 'datum': 'NAD83'}, {'zone_num': '12S', 'datum': 'WGS84'},
+             {'zone_num': '12N', 'datum': 'NAD83'}]
+    crs = build_crs_batch(specs)
+    assert len(crs) == 3
+    assert crs[0][0].to_epsg() == 6341
+    assert crs[1][0].to_epsg() == 32712
+    assert crs[2] is crs[0]
+
+
 def test_return_files_from_path():
     fil = get_testfile_paths()
-    assert return_files_from_path(fil) == [fil]
\ No newline at end of file
+    assert return_files_from_path(fil) == [fil]
+    # a single extension string is matched as a whole extension, not as its characters
+    assert return_files_from_path(fil, file_ext='.all') == [fil]
+    assert return_files_from_path(fil, file_ext='.kmall') == []
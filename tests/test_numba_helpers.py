@@ -30,3 +30,12 @@ def test_hist2d_numba_seq():
     hist2d = hist2d_numba_seq(x, y, bins, ranges)
 
     assert np.array_equal(hist2d, np.array([[5., 0.], [0., 5.]]))
+
+
+def test_unwrap_degrees():
+    heading = np.array([350.0, 355.0, 359.5, 2.0, 10.0, 5.0, 358.0, 180.0, 0.5], dtype=np.float32)
+    unwrapped = np.empty(len(heading), dtype=np.float32)
+    unwrap_degrees(heading, unwrapped)
+
+    expected = np.float32(np.rad2deg(np.unwrap(np.deg2rad(heading.astype(np.float64)))))
+    assert np.allclose(unwrapped, expected, atol=1e-4)
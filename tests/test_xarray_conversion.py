@@ -107,3 +107,13 @@ def test_batch_read_configure_options():
         'navigation': {'chunksize': kluster_variables.navigation_chunk_size, 'chunks': kluster_variables.nav_chunks,
                        'combine_attributes': False, 'output_arrs': [], 'time_arrs': [], 'final_pths': None, 'final_attrs': None}}
     assert opts == expected_opts
+
+
+def test_normalize_subset_time():
+    assert normalize_subset_time(None) is None
+    single = normalize_subset_time([1531317999, 1531321000])
+    assert single.dtype == np.float64
+    assert np.array_equal(single, np.array([[1531317999.0, 1531321000.0]]))
+    multiple = normalize_subset_time([[1531317999, 1531318885], [1531318886, 1531321000]])
+    assert np.array_equal(multiple, np.array([[1531317999.0, 1531318885.0], [1531318886.0, 1531321000.0]]))
+    assert normalize_subset_time(multiple) is multiple
@@ -1,4 +1,6 @@
+import tempfile
 from HSTB.kluster.xarray_helpers import *
+from HSTB.kluster.xarray_helpers import _subtract_gaps
 
 
 def test_compare_and_find_gaps():
@@ -18,6 +20,16 @@ def test_compare_and_find_gaps():
     assert np.array_equal(chk, np.array([[4, 6]]))
 
 
+def test_subtract_gaps():
+    datagap_times = np.array([[0, 5], [30, 40], [70, 82], [90, 100]])
+    existing_gap_times = np.array([[10, 15], [35, 45], [75, 80], [85, 95]])
+    # data gaps are split around contained existing gaps and trimmed to partially overlapping existing gaps
+    assert np.array_equal(_subtract_gaps(datagap_times, existing_gap_times),
+                          np.array([[0, 5], [30, 35], [70, 75], [80, 82], [95, 100]]))
+    # data gaps entirely within an existing gap are dropped
+    assert _subtract_gaps(np.array([[4, 6]]), np.array([[3, 7]])).shape == (0, 2)
+
+
 def test_get_beamwise_interpolation():
     # ping time plus delay equals beam time at ping
     ping_time = xr.DataArray(np.arange(10), coords={'time': np.arange(10)}, dims=['time'])
@@ -50,6 +62,34 @@ def test_return_chunk_slices():
     assert chnkslices[-1] == slice(90, 100, None)
 
 
+def test_return_chunk_slices_from_zarr():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rootgroup = zarr.open(tmpdir, mode='w')
+        rootgroup.create_dataset('time', data=np.arange(95), chunks=(10,))
+
+        chnkslices = return_chunk_slices_from_zarr(tmpdir, 'time')
+        assert len(chnkslices) == 10
+        assert chnkslices[0] == slice(0, 10, None)
+        assert chnkslices[-1] == slice(90, 95, None)
+
+
+def test_reload_zarr_records_consolidated():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        xr.Dataset({'x': ('time', np.arange(10))}, coords={'time': np.arange(10)}).to_zarr(tmpdir, consolidated=True)
+        first = reload_zarr_records(tmpdir, skip_dask=True, consolidated=True)
+        second = reload_zarr_records(tmpdir, skip_dask=True, consolidated=True)
+        assert first.x.shape == second.x.shape == (10,)
+        # attributes set on a reloaded dataset do not end up in the cached one
+        first.attrs['test'] = 1
+        assert 'test' not in second.attrs
+
+        # a write rewrites the consolidated metadata, the next reload sees the new data
+        xr.Dataset({'x': ('time', np.arange(5))}, coords={'time': np.arange(10, 15)}).to_zarr(tmpdir, append_dim='time',
+                                                                                               consolidated=True)
+        third = reload_zarr_records(tmpdir, skip_dask=True, consolidated=True)
+        assert third.x.shape == (15,)
+
+
 def test_stack_and_reform_nan_array():
     # build an array with nans
     data = np.full((10, 400), 1.5)
@@ -78,6 +118,31 @@ def test_stack_and_reform_nan_array():
     assert np.isnan(orig_array[3, 150])
 
 
+def test_reform_nan_array_chunked():
+    data = np.full((10, 40), 1.5)
+    data[1, 5] = np.nan
+    data[7, 30] = np.nan
+    data_array = xr.DataArray(data, coords={'time': np.arange(10), 'beam': np.arange(40)}, dims=['time', 'beam'])
+    original_index, stacked_data = stack_nan_array(data_array)
+
+    eager = reform_nan_array(stacked_data, original_index, data_array.shape, data_array.coords, data_array.dims)
+    lazy = reform_nan_array(stacked_data, original_index, data_array.shape, data_array.coords, data_array.dims, chunks=4)
+    assert lazy.chunks == ((4, 4, 2), (40,))
+    assert np.array_equal(lazy.values, eager.values, equal_nan=True)
+
+
+def test_stack_nan_array_flat():
+    data = np.arange(12, dtype=np.float64).reshape(3, 4)
+    data[0, 1] = np.nan
+    data[2, 3] = np.nan
+    data_array = xr.DataArray(data, coords={'time': np.arange(3), 'beam': np.arange(4)}, dims=['time', 'beam'])
+    original_index, flat = stack_nan_array_flat(data_array)
+
+    assert isinstance(flat, np.ndarray)
+    assert np.array_equal(flat, np.array([0, 2, 3, 4, 5, 6, 7, 8, 9, 10]))
+    assert np.array_equal(data[original_index], flat)
+
+
 def test_clear_data_vars_from_dataset():
     ping_time = np.arange(100)
     data_arr = np.arange(100)
@@ -161,3 +226,14 @@ def test_combine_xr_attributes():
                      'multibeam_files': ['testthis.all', 'testthis2.all', 'testthis3.all'],  # list of all files across attributes
                      'survey_number': ['h12335', 'h12345']}  # unique survey identifiers found
     assert newattrs == compare_attrs
+
+
+def test_combine_xr_attributes_serial_numbers():
+    # a single serial number is kept as provided, different serial numbers are combined into a sorted list
+    tst1 = xr.Dataset()
+    tst1.attrs = {'system_serial_number': 123, 'secondary_system_serial_number': 124}
+    tst2 = xr.Dataset()
+    tst2.attrs = {'system_serial_number': 123, 'secondary_system_serial_number': 122}
+    newattrs = combine_xr_attributes([tst1, tst2])
+    assert newattrs['system_serial_number'] == 123
+    assert newattrs['secondary_system_serial_number'] == [122, 124]